@@ -0,0 +1,90 @@
+// Background jobs panel: shows the progress of jobs, followed through the websocket
+
+// Callbacks called when a job ends, by job ID
+var job_end_callbacks = {};
+
+// Show a job in the jobs panel and follow it. If onEnd is given, it's called with
+// the job end message. Else, the page is reloaded when a job started from it is done.
+function followJob(job, onEnd) {
+	if (onEnd) job_end_callbacks[job.id] = onEnd;
+	if (!$("#job-" + job.id).length) addJobPanel(job);
+	var deferred = $.Deferred();
+	deferred.done(function(value) {
+		window.zynthianSocket.registerHandler('JobMessageHandler', onJobMessage);
+		sendJobMessage("ATTACH " + job.id);
+	});
+	connectZynthianWebSocket(deferred);
+}
+
+function addJobPanel(job) {
+	var jobDiv = $('<div class="job col-xs-12">').attr("id", "job-" + job.id).data("page", job.page);
+	var heading = $('<div class="panel-heading">')
+		.append($('<strong>').text(job.title))
+		.append(' (').append($('<span class="job-state">').text(job.state)).append(')')
+		.append($('<button type="button" class="job-cancel btn btn-xs btn-danger pull-right">Cancel</button>')
+			.click(function() { cancelJob(job.id); }))
+		.append($('<button type="button" class="btn btn-xs btn-default pull-right">Log</button>')
+			.click(function() { toggleJobLog(job.id); }));
+	var bar = $('<div class="progress-bar">');
+	var body = $('<div class="panel-body">')
+		.append($('<div class="progress">').append(bar))
+		.append('<div class="job-last-line"></div>')
+		.append('<pre class="job-log" style="display:none; max-height:300px; overflow:auto;"></pre>');
+	jobDiv.append($('<div class="panel panel-default">').append(heading).append(body));
+	$("#jobs_panel").append(jobDiv);
+	setJobProgress(jobDiv, job.progress);
+}
+
+function sendJobMessage(data) {
+	window.zynthianSocket.send(JSON.stringify({"handler_name": "JobMessageHandler", "data": data}));
+}
+
+function cancelJob(job_id) {
+	$("#job-" + job_id + " .job-cancel").prop('disabled', true);
+	sendJobMessage("CANCEL " + job_id);
+}
+
+function toggleJobLog(job_id) {
+	$("#job-" + job_id + " .job-log").toggle();
+}
+
+function setJobProgress(jobDiv, progress) {
+	var bar = jobDiv.find(".progress-bar");
+	if (progress === null || progress === undefined) {
+		bar.addClass("progress-bar-striped active").css("width", "100%").text("");
+	} else {
+		bar.removeClass("progress-bar-striped active").css("width", progress + "%").text(Math.round(progress) + "%");
+	}
+}
+
+function onJobMessage(data) {
+	var jobDiv = $("#job-" + data.job);
+	if (!jobDiv.length) return;
+	if (data.text !== undefined) {
+		var lines = data.text.replace(/\n$/, '').split("\n");
+		var logPre = jobDiv.find(".job-log");
+		logPre.append(document.createTextNode(data.text));
+		logPre.scrollTop(logPre.prop("scrollHeight"));
+		jobDiv.find(".job-last-line").text(lines[lines.length - 1]);
+	} else if (data.progress !== undefined) {
+		setJobProgress(jobDiv, data.progress);
+	} else if (data.state) {
+		jobDiv.find(".job-state").text(data.state);
+		jobDiv.find(".job-cancel").hide();
+		var bar = jobDiv.find(".progress-bar").removeClass("progress-bar-striped active").css("width", "100%").text("");
+		if (data.state == "done") {
+			bar.addClass("progress-bar-success");
+		} else {
+			bar.addClass("progress-bar-danger");
+			jobDiv.find(".panel").removeClass("panel-default").addClass("panel-danger");
+			jobDiv.find(".job-log").show();
+		}
+		if (job_end_callbacks[data.job]) {
+			job_end_callbacks[data.job](data);
+			delete job_end_callbacks[data.job];
+		} else if (data.state == "done" && jobDiv.data("page") == window.location.pathname) {
+			// Reload the page that started the job, so it shows the results
+			window.location.href = window.location.pathname;
+		}
+	}
+}
@@ -1,25 +1,46 @@
 function connectZynthianWebSocket(onopenDeferred){
+	// A single connection is shared by all the scripts in the page
+	var zynthianSocket = window.zynthianSocket;
+	if (zynthianSocket && zynthianSocket.readyState <= 1) {
+		if (zynthianSocket.readyState == 1) onopenDeferred.resolve();
+		else zynthianSocket.onopenDeferreds.push(onopenDeferred);
+		return;
+	}
 	var url = window.location.href
 	var parts = url.split("/");
 	var wsprot = "ws"
 	if (parts[0]=="https:") wsprot = "wss"
-	var zynthianSocket = new WebSocket(wsprot + "://"+parts[2]+"/ws");
+	zynthianSocket = new WebSocket(wsprot + "://"+parts[2]+"/ws");
+	zynthianSocket.messageHandler = {};
+	zynthianSocket.onopenDeferreds = [onopenDeferred];
 	zynthianSocket.onconnecting = function(evn){
 		console.log("zynthianSocket:onconnecting:",evn);
 
 	}
 	zynthianSocket.onopen = function(evn){
 		console.log("zynthianSocket:onopen:",evn);
-		this.messageHandler = {};
-		onopenDeferred.resolve();
+		for (const deferred of this.onopenDeferreds) {
+			deferred.resolve();
+		}
+		this.onopenDeferreds = [];
 	}
 	zynthianSocket.onclose = function(evn){
 		console.log("zynthianSocket.onclose:",evn);
 	}
 
 	zynthianSocket.onmessage = function(evn){
-		console.log("zynthianSocket.onmessage:",evn.data);
 		var jsonMessage = JSON.parse(evn.data);
+		// Server batches pending messages into a single frame
+		if (Array.isArray(jsonMessage)) {
+			for (const msg of jsonMessage) {
+				this.dispatchMessage(msg);
+			}
+		} else {
+			this.dispatchMessage(jsonMessage);
+		}
+	}
+
+	zynthianSocket.dispatchMessage = function(jsonMessage) {
 		if (this.messageHandler[jsonMessage._handler_name]){
 			this.messageHandler[jsonMessage._handler_name](jsonMessage._data);
 		}
@@ -29,5 +50,13 @@ function connectZynthianWebSocket(onopenDeferred){
 	zynthianSocket.registerHandler = function(handlerName, onmessage) {
 		this.messageHandler[handlerName] = onmessage;
 	}
+
+	zynthianSocket.subscribe = function(topic) {
+		this.send(JSON.stringify({"handler_name": "SubscriptionMessageHandler", "data": "SUBSCRIBE " + topic}));
+	}
+
+	zynthianSocket.unsubscribe = function(topic) {
+		this.send(JSON.stringify({"handler_name": "SubscriptionMessageHandler", "data": "UNSUBSCRIBE " + topic}));
+	}
 	window.zynthianSocket = zynthianSocket;
 }
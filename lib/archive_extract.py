@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Streaming Archive Extraction
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+
+import os
+import shutil
+import logging
+import tarfile
+import zipfile
+
+# Size of the reads from the archive members
+CHUNK_SIZE = 256 * 1024
+
+# Archive extensions and their tarfile stream modes (None => zip)
+ARCHIVE_EXTENSIONS = {
+    '.tar.bz2': "r|bz2",
+    '.tar.gz': "r|gz",
+    '.tar.xz': "r|xz",
+    '.tgz': "r|gz",
+    '.zip': None
+}
+
+# Members in these dirs are not extracted
+SKIPPED_DIRS = ("__MACOSX",)
+
+# ------------------------------------------------------------------------------
+# Streaming Archive Extraction
+# ------------------------------------------------------------------------------
+
+
+def split_archive_ext(fpath):
+    """Return (path without extension, archive extension), or (fpath, None) if it's not an archive."""
+    for ext in ARCHIVE_EXTENSIONS:
+        if fpath.endswith(ext):
+            return fpath[:-len(ext)], ext
+    return fpath, None
+
+
+def get_member_path(name, strip_dir=None):
+    """
+    Return the relative path where an archive member is extracted, or None if it's skipped.
+    Unsafe names (absolute, "..") and members in SKIPPED_DIRS are skipped. If the first
+    component of the name is strip_dir, it's removed, unrolling the nested dir.
+    """
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or ".." in parts or any(p in SKIPPED_DIRS for p in parts):
+        return None
+    if strip_dir and parts[0] == strip_dir:
+        parts = parts[1:]
+        if not parts:
+            return None
+    return os.path.join(*parts)
+
+
+class ProgressReader:
+    """Wraps a file, calling progress(percent) as it's read."""
+
+    def __init__(self, f, size, progress):
+        self.f = f
+        self.size = size
+        self.progress = progress
+        self.percent = -1
+
+    def read(self, n=-1):
+        data = self.f.read(n)
+        if self.size:
+            percent = 100 * self.f.tell() // self.size
+            if percent != self.percent:
+                self.percent = percent
+                self.progress(percent)
+        return data
+
+
+def extract_archive(fpath, dpath, strip_dir=None, progress=None, is_cancelled=None):
+    """
+    Extract an archive into a directory, member by member, streaming every file in chunks.
+    Tar archives are read sequentially, as a stream. Nested dir unrolling (strip_dir) and
+    skipped dirs are applied to the member names, so no moving is needed after extracting.
+    Only regular files & directories are extracted. Return the number of extracted files.
+    """
+    base, ext = split_archive_ext(fpath)
+    if ext is None:
+        raise ValueError("Unknown archive format: {}".format(fpath))
+    os.makedirs(dpath, exist_ok=True)
+    size = os.path.getsize(fpath)
+    count = 0
+    with open(fpath, "rb") as raw:
+        src = ProgressReader(raw, size, progress) if progress else raw
+        if ARCHIVE_EXTENSIONS[ext]:
+            with tarfile.open(fileobj=src, mode=ARCHIVE_EXTENSIONS[ext]) as tar:
+                for member in tar:
+                    if is_cancelled and is_cancelled():
+                        break
+                    if extract_member(member.name, member.isdir(), member.isfile(),
+                                      lambda: tar.extractfile(member), dpath, strip_dir):
+                        count += 1
+        else:
+            with zipfile.ZipFile(raw) as zf:
+                # Zip members are read with random access => report the extracted bytes
+                total = sum(zinfo.file_size for zinfo in zf.infolist())
+                done = 0
+                for zinfo in zf.infolist():
+                    if is_cancelled and is_cancelled():
+                        break
+                    if extract_member(zinfo.filename, zinfo.is_dir(), not zinfo.is_dir(),
+                                      lambda: zf.open(zinfo), dpath, strip_dir):
+                        count += 1
+                    done += zinfo.file_size
+                    if progress:
+                        progress(100 * done // total if total else 100)
+    return count
+
+
+def extract_member(name, isdir, isfile, open_member, dpath, strip_dir):
+    rpath = get_member_path(name, strip_dir)
+    if rpath is None:
+        return False
+    target = os.path.join(dpath, rpath)
+    if isdir:
+        os.makedirs(target, exist_ok=True)
+        return False
+    if not isfile:
+        logging.warning("Skipping archive member '{}': not a regular file".format(name))
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open_member() as src, open(target, "wb") as dest:
+        shutil.copyfileobj(src, dest, CHUNK_SIZE)
+    return True
+
+# ------------------------------------------------------------------------------
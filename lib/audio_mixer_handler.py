@@ -26,12 +26,11 @@ import os
 import re
 import sys
 import logging
-import jsonpickle
 from typing import Optional, Awaitable
 
 import tornado.web
 from lib.audio_config_handler import AudioConfigHandler
-from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler, ZynthianWebSocketMessage
+from lib.zynthian_websocket_handler import ZynthianWebSocketHandler, ZynthianWebSocketMessageHandler, ZynthianWebSocketMessage
 from zyngine.zynthian_engine_alsa_mixer import *
 
 
@@ -40,7 +39,8 @@ from zyngine.zynthian_engine_alsa_mixer import *
 # ------------------------------------------------------------------------------
 class AudioMixerHandler(tornado.web.RequestHandler):
 
-    websocket_message_handler_list = []
+    # Websocket topic for the mixer controller updates
+    TOPIC = "audio_mixer"
 
     def get_current_user(self):
         return self.get_secure_cookie("user")
@@ -52,10 +52,9 @@ class AudioMixerHandler(tornado.web.RequestHandler):
         try:
             logging.debug(
                 'updating webconfig view: {} with {}'.format(ctrl, val))
-            for websocket_message_handler in AudioMixerHandler.websocket_message_handler_list:
-                logging.debug('message_handler: {}'.format(
-                    websocket_message_handler))
-                websocket_message_handler.update_controller_value(ctrl, val)
+            message = ZynthianWebSocketMessage(
+                'AudioConfigMessageHandler', '{}={}'.format(ctrl, val))
+            ZynthianWebSocketHandler.publish(AudioMixerHandler.TOPIC, message)
 
         except Exception as err:
             result['errors'] = str(err)
@@ -65,24 +64,10 @@ class AudioMixerHandler(tornado.web.RequestHandler):
         if result:
             self.write(result)
 
-    @classmethod
-    def register_websocket(self, websocket_message_handler: ZynthianWebSocketMessageHandler):
-        AudioMixerHandler.websocket_message_handler_list.append(
-            websocket_message_handler)
-
-    @classmethod
-    def unregister_websocket(self, websocket_message_handler: ZynthianWebSocketMessageHandler):
-        AudioMixerHandler.websocket_message_handler_list.remove(
-            websocket_message_handler)
-
 
 class AudioConfigMessageHandler(ZynthianWebSocketMessageHandler):
     logging_thread = None
 
-    @classmethod
-    def is_registered_for(cls, handler_name):
-        return handler_name == 'AudioConfigMessageHandler'
-
     def on_websocket_message(self, action_with_parameters):
         # logging.debug("action: %s " % action_with_parameters)
 
@@ -91,14 +76,11 @@ class AudioConfigMessageHandler(ZynthianWebSocketMessageHandler):
         if action == 'UPDATE_AUDIO_MIXER':
             self.do_update_audio_mixer(parm1, parm2)
         elif action == 'REGISTER_WEBSOCKET':
-            AudioMixerHandler.register_websocket(self)
+            self.websocket.subscribe(AudioMixerHandler.TOPIC)
         else:
             logging.error('Unknown action {}'.format(action))
         # logging.debug("message handled.")  # this needs to show up early to get the socket working again.
 
-    def on_close(self):
-        AudioMixerHandler.unregister_websocket(self)
-
     def do_update_audio_mixer(self, symbol, value):
         try:
             zctrl = AudioConfigHandler.zctrls[symbol]
@@ -109,8 +91,3 @@ class AudioConfigMessageHandler(ZynthianWebSocketMessageHandler):
         except Exception as e:
             logging.error(
                 "Can't set controller '{}' value to '{}': {}".format(symbol, value, e))
-
-    def update_controller_value(self, symbol, value):
-        message = ZynthianWebSocketMessage(
-            'AudioConfigMessageHandler', '{}={}'.format(symbol, value))
-        self.websocket.write_message(jsonpickle.encode(message))
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Background Jobs
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+
+import os
+import re
+import time
+import uuid
+import signal
+import asyncio
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.file_info_cache import CACHE_DIR
+
+JOBS_DIR = os.environ.get('ZYNTHIAN_WEBCONF_JOBS_DIR', CACHE_DIR + "/jobs")
+# Finished jobs kept in the registry (and their logs on disk)
+MAX_FINISHED_JOBS = 20
+# Max length of an output line
+MAX_LINE_LENGTH = 1024 * 1024
+# Jobs running at the same time. The rest wait for a free slot, in order.
+MAX_RUNNING_JOBS = int(os.environ.get('ZYNTHIAN_WEBCONF_MAX_JOBS', 2))
+
+# Worker threads for the jobs running blocking code
+job_executor = ThreadPoolExecutor(max_workers=MAX_RUNNING_JOBS, thread_name_prefix="webconf_job")
+
+# ------------------------------------------------------------------------------
+# Background Job
+# ------------------------------------------------------------------------------
+
+
+class BackgroundJob:
+    """
+    A long-running task, running on the IOLoop, out of any request.
+    Output is appended to a log file on disk and multicast to the listeners.
+    Output is always line-aligned, so byte offsets in the log can be used
+    to resume reading it from any previously received position.
+    Listeners are callables receiving a dict:
+        {'job': id, 'offset': start, 'end': end, 'text': "..."} for every output line
+        {'job': id, 'progress': percent} when the progress changes
+        {'job': id, 'state': "done" | "failed" | "cancelled", 'returncode': n} when the job ends
+    """
+
+    def __init__(self, key, title=None):
+        self.key = key
+        self.title = title or key
+        self.id = uuid.uuid4().hex[:12]
+        self.state = "pending"
+        self.progress = None
+        self.returncode = None
+        # Path of the webconf page following the job, if any
+        self.page = None
+        self.started = None
+        self.finished = None
+        self.log_fpath = f"{JOBS_DIR}/{self.id}.log"
+        self.log_size = 0
+        self.log_file = None
+        self.listeners = []
+        self.task = None
+
+    def is_running(self):
+        return self.state in ("pending", "running")
+
+    def start(self, slots=None):
+        """Start the job. If a semaphore is given, the job is pending until it gets a slot."""
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        self.log_file = open(self.log_fpath, "ab")
+        self.task = asyncio.ensure_future(self.run_wrapper(slots))
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+    async def run_wrapper(self, slots=None):
+        try:
+            if slots is None:
+                await self.run_started()
+            else:
+                async with slots:
+                    await self.run_started()
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+        except Exception as e:
+            logging.error(f"Job '{self.title}' failed => {e}")
+            self.append_line(f"ERROR: {e}")
+            self.state = "failed"
+        self.finished = time.time()
+        self.log_file.close()
+        self.notify({'job': self.id, 'state': self.state, 'returncode': self.returncode})
+
+    async def run_started(self):
+        self.state = "running"
+        self.started = time.time()
+        self.returncode = await self.run()
+        self.state = "done" if self.returncode == 0 else "failed"
+
+    async def run(self):
+        """Do the job, calling append_line for the output. Return the exit code."""
+        raise NotImplementedError("Please Implement run")
+
+    def append_line(self, line):
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        if not line.endswith(b"\n"):
+            line += b"\n"
+        self.log_file.write(line)
+        self.log_file.flush()
+        offset = self.log_size
+        self.log_size += len(line)
+        self.notify({
+            'job': self.id,
+            'offset': offset,
+            'end': self.log_size,
+            'text': line.decode("utf-8", errors="replace")
+        })
+
+    def set_progress(self, progress):
+        """Set the progress of the job, as a percentage, or None if unknown."""
+        if progress != self.progress:
+            self.progress = progress
+            self.notify({'job': self.id, 'progress': progress})
+
+    def notify(self, data):
+        for listener in list(self.listeners):
+            try:
+                listener(data)
+            except Exception as e:
+                logging.warning(f"Can't notify job listener => {e}")
+
+    def read_log(self, offset=0):
+        """Return the log content from offset, as text, and the offset at its end."""
+        offset = min(max(offset, 0), self.log_size)
+        try:
+            with open(self.log_fpath, "rb") as f:
+                f.seek(offset)
+                data = f.read(self.log_size - offset)
+        except FileNotFoundError:
+            data = b""
+        return data.decode("utf-8", errors="replace"), offset + len(data)
+
+    def attach(self, listener, offset=0):
+        """
+        Send the log from offset to a listener and add it to the listeners,
+        so it gets the output from there on. If the job has ended, the end
+        notification is sent instead.
+        """
+        text, end = self.read_log(offset)
+        if text:
+            listener({'job': self.id, 'offset': offset, 'end': end, 'text': text})
+        if self.is_running():
+            if listener not in self.listeners:
+                self.listeners.append(listener)
+        else:
+            listener({'job': self.id, 'state': self.state, 'returncode': self.returncode})
+
+    def detach(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def get_status(self):
+        return {
+            'id': self.id,
+            'key': self.key,
+            'title': self.title,
+            'state': self.state,
+            'progress': self.progress,
+            'returncode': self.returncode,
+            'started': self.started,
+            'finished': self.finished,
+            'log_size': self.log_size,
+            'page': self.page
+        }
+
+    def remove_log(self):
+        try:
+            os.remove(self.log_fpath)
+        except OSError:
+            pass
+
+# ------------------------------------------------------------------------------
+# Subprocess Job
+# ------------------------------------------------------------------------------
+
+
+class SubprocessJob(BackgroundJob):
+    """Runs a command with asyncio.create_subprocess_exec, logging its output (stdout & stderr)."""
+
+    def __init__(self, key, args, title=None):
+        super().__init__(key, title)
+        self.args = args
+        self.process = None
+
+    async def run(self):
+        logging.info(f"Running job '{self.title}': {' '.join(self.args)}")
+        self.process = await asyncio.create_subprocess_exec(*self.args,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, limit=MAX_LINE_LENGTH)
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                self.append_line(line)
+            return await self.process.wait()
+        except asyncio.CancelledError:
+            if self.process.returncode is None:
+                self.process.terminate()
+            raise
+
+# ------------------------------------------------------------------------------
+# Thread Job
+# ------------------------------------------------------------------------------
+
+
+class ThreadJob(BackgroundJob):
+    """
+    Runs a blocking function in the job worker threads, as func(job, *args).
+    The function returns None if successful, or an error message.
+    From the worker thread, the function can use:
+        job.log(line): append a line to the job log
+        job.report_progress(percent): set the job progress
+        job.run_command(cmd): run a command, logging its output
+        job.is_cancelled(): check if the job has been cancelled
+    """
+
+    def __init__(self, key, func, *args, title=None):
+        super().__init__(key, title)
+        self.func = func
+        self.args = args
+        self.loop = None
+        self.cancel_event = threading.Event()
+        self.process = None
+        self.last_line = ""
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self.state == "pending":
+            super().cancel()
+        elif self.process and self.process.poll() is None:
+            # Terminate the whole process group, so shell children are terminated too
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+            except OSError as e:
+                logging.warning(f"Can't terminate job '{self.title}' process => {e}")
+
+    async def run(self):
+        logging.info(f"Running job '{self.title}'")
+        self.loop = asyncio.get_running_loop()
+        res = await self.loop.run_in_executor(job_executor, self.run_function)
+        if self.cancel_event.is_set():
+            raise asyncio.CancelledError()
+        return res
+
+    def run_function(self):
+        errors = self.func(self, *self.args)
+        if errors:
+            self.log(f"ERROR: {errors}")
+            return 1
+        return 0
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def log(self, line):
+        self.loop.call_soon_threadsafe(self.append_line, line)
+
+    def report_progress(self, progress):
+        self.loop.call_soon_threadsafe(self.set_progress, progress)
+
+    def run_command(self, cmd, shell=True, progress_re=None):
+        """
+        Run a command from the worker thread, logging its output (stdout & stderr).
+        Carriage returns are taken as line ends. If a progress regexp is given, the
+        matching lines set the job progress from the first group, instead of being logged.
+        The last line is kept in last_line. Return the exit code.
+        """
+        if self.is_cancelled():
+            return -signal.SIGTERM
+        if progress_re:
+            progress_re = re.compile(progress_re)
+        self.process = subprocess.Popen(cmd, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, errors="replace", start_new_session=True)
+        try:
+            for line in self.process.stdout:
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                if progress_re:
+                    m = progress_re.search(line)
+                    if m:
+                        self.report_progress(float(m.group(1)))
+                        continue
+                self.last_line = line
+                self.log(line)
+            return self.process.wait()
+        finally:
+            self.process.stdout.close()
+            self.process = None
+
+# ------------------------------------------------------------------------------
+# Job Registry
+# ------------------------------------------------------------------------------
+
+
+class JobRegistry:
+    """
+    Schedules the background jobs and keeps the running ones and the last finished ones, by ID.
+    At most MAX_RUNNING_JOBS are running at the same time, the rest are pending.
+    Jobs with the same key are not run concurrently: starting a job while
+    another one with the same key is pending or running returns that one.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.slots = None
+        self.remove_stale_logs()
+
+    @staticmethod
+    def remove_stale_logs():
+        """Remove the job logs left by previous runs. Their jobs are not registered anymore."""
+        try:
+            for entry in os.scandir(JOBS_DIR):
+                if entry.name.endswith(".log"):
+                    os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning(f"Can't remove stale job logs => {e}")
+
+    def start(self, job):
+        running = self.find(job.key)
+        if running and running.is_running():
+            return running
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(MAX_RUNNING_JOBS)
+        self.jobs[job.id] = job
+        job.start(self.slots)
+        self.prune()
+        return job
+
+    def submit(self, key, func, *args, title=None):
+        """Run func(job, *args) in a worker thread, as a ThreadJob. Return the job."""
+        return self.start(ThreadJob(key, func, *args, title=title))
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job and job.is_running():
+            logging.info(f"Cancelling job '{job.title}'")
+            job.cancel()
+            return True
+        return False
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def get_running(self):
+        return [job for job in self.jobs.values() if job.is_running()]
+
+    def find(self, key):
+        """Return the last job with a key, running or not."""
+        res = None
+        for job in self.jobs.values():
+            if job.key == key:
+                res = job
+        return res
+
+    def is_running(self, key):
+        """Check if a job with a key is running. start() returns it instead of starting a new one."""
+        job = self.find(key)
+        return job is not None and job.is_running()
+
+    def prune(self):
+        finished = [job for job in self.jobs.values() if not job.is_running()]
+        for job in finished[:-MAX_FINISHED_JOBS]:
+            job.remove_log()
+            del self.jobs[job.id]
+
+
+background_jobs = JobRegistry()
+
+# ------------------------------------------------------------------------------
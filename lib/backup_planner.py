@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Backup Items Planner
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+
+from lib.file_info_cache import CACHE_DIR
+
+# Zip archive overhead: local header (30), data descriptor (16) & central directory
+# header (46) for every entry, plus its name twice, and the end record (22)
+ZIP_ENTRY_OVERHEAD = 30 + 16 + 46
+ZIP_END_SIZE = 22
+# Files rewritten in place don't change their directory's mtime, so the sizes
+# of a plan may get stale. Plans are walked again after this time (seconds).
+PLAN_MAX_AGE = 3600
+
+# ------------------------------------------------------------------------------
+# Backup Item Matcher
+# ------------------------------------------------------------------------------
+
+
+def glob_to_regex(pattern):
+    """Translate a path glob to a regex. Wildcards don't match across "/", as with Path.match."""
+    res = ""
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            res += "[^/]*"
+        elif c == "?":
+            res += "[^/]"
+        elif c == "[":
+            j = pattern.find("]", i + 1 if i < n and pattern[i] in "!]" else i)
+            if j < 0:
+                res += "\\["
+            else:
+                chars = pattern[i:j].replace("\\", "\\\\")
+                if chars.startswith("!"):
+                    # Negated classes don't match "/" either
+                    chars = "^/" + chars[1:]
+                elif chars.startswith("^"):
+                    chars = "\\" + chars
+                res += "[" + chars + "]"
+                i = j + 1
+        else:
+            res += re.escape(c)
+    return res
+
+
+class BackupItemMatcher:
+    """
+    Backup items compiled into a single matcher. Items are directories to backup,
+    or exclude patterns if prefixed by "^". Environment variables are expanded.
+    Exclude patterns work like Path.match: absolute patterns match from the root,
+    relative ones match the last path components. A path is excluded if it, or
+    any of its parent directories, matches an exclude pattern.
+    """
+
+    def __init__(self, backup_items):
+        self.bdirs = []
+        self.xpats = []
+        for bitem in backup_items:
+            bitem = os.path.expandvars(bitem).strip()
+            if bitem.startswith("^"):
+                xpat = bitem[1:].rstrip("/")
+                if xpat:
+                    self.xpats.append(xpat)
+            elif bitem:
+                self.bdirs.append(bitem)
+        self.bdir_prefixes = tuple(bdir.rstrip("/") + "/" for bdir in self.bdirs)
+        if self.xpats:
+            xregexs = []
+            for xpat in self.xpats:
+                if xpat.startswith("/"):
+                    xregexs.append("^" + glob_to_regex(xpat) + "(?:/|$)")
+                else:
+                    xregexs.append("(?:^|/)" + glob_to_regex(xpat) + "(?:/|$)")
+            self.xregex = re.compile("|".join(xregexs))
+        else:
+            self.xregex = None
+
+    def is_excluded(self, path):
+        return self.xregex is not None and self.xregex.search(path) is not None
+
+    def is_included(self, path):
+        """Return True if the path is inside a backup directory and it's not excluded."""
+        path = path.rstrip("/")
+        if path not in self.bdirs and not path.startswith(self.bdir_prefixes):
+            return False
+        return not self.is_excluded(path)
+
+# ------------------------------------------------------------------------------
+# Backup Plan
+# ------------------------------------------------------------------------------
+
+
+class BackupPlan:
+    """
+    Manifest of the files to backup, as a list of [dirname, [fname, ...]] in walk order,
+    with the totals and the mtime of every walked directory. Adding, removing or renaming
+    an entry changes the mtime of its directory, so the file list is valid while they match.
+    Files rewritten in place are not detected: the sizes are estimations, refreshed
+    when the plan expires (PLAN_MAX_AGE).
+    """
+
+    def __init__(self, backup_items, dirs=None, dir_mtimes=None, total_files=0, total_bytes=0, zip_size=ZIP_END_SIZE, created=0):
+        self.backup_items = list(backup_items)
+        self.created = created
+        self.dirs = dirs if dirs is not None else []
+        self.dir_mtimes = dir_mtimes if dir_mtimes is not None else {}
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        # Estimated size of the archive, stored (not compressed)
+        self.zip_size = zip_size
+
+    @classmethod
+    def walk(cls, backup_items):
+        """Walk the backup dirs once, pruning the excluded subtrees, and return the plan."""
+        matcher = BackupItemMatcher(backup_items)
+        plan = cls(backup_items, created=time.time())
+        for bdir in matcher.bdirs:
+            if matcher.is_excluded(bdir):
+                continue
+            try:
+                plan.dir_mtimes[bdir] = os.stat(bdir).st_mtime_ns
+            except OSError:
+                # Not existing yet => the plan is valid while it doesn't exist
+                plan.dir_mtimes[bdir] = None
+                continue
+            for dirname, subdirs, files in os.walk(bdir):
+                subdirs[:] = [d for d in subdirs if not matcher.is_excluded(os.path.join(dirname, d))]
+                fnames = []
+                for fname in files:
+                    fpath = os.path.join(dirname, fname)
+                    if matcher.is_excluded(fpath):
+                        continue
+                    try:
+                        size = os.stat(fpath).st_size
+                    except OSError:
+                        continue
+                    fnames.append(fname)
+                    plan.total_bytes += size
+                    plan.zip_size += size + ZIP_ENTRY_OVERHEAD + 2 * len(fpath.encode())
+                for d in subdirs:
+                    try:
+                        plan.dir_mtimes[os.path.join(dirname, d)] = os.stat(os.path.join(dirname, d)).st_mtime_ns
+                    except OSError:
+                        pass
+                plan.dirs.append([dirname, fnames])
+                plan.total_files += len(fnames)
+                if dirname != "/":
+                    plan.zip_size += ZIP_ENTRY_OVERHEAD + 2 * (len(dirname.encode()) + 1)
+        return plan
+
+    @classmethod
+    def merge(cls, plans):
+        """Return a plan including all the files of several plans."""
+        res = cls([], created=min((plan.created for plan in plans), default=0))
+        for plan in plans:
+            res.backup_items += plan.backup_items
+            res.dirs += plan.dirs
+            res.dir_mtimes.update(plan.dir_mtimes)
+            res.total_files += plan.total_files
+            res.total_bytes += plan.total_bytes
+            res.zip_size += plan.zip_size - ZIP_END_SIZE
+        return res
+
+    def is_valid(self):
+        if time.time() - self.created > PLAN_MAX_AGE:
+            return False
+        for dpath, mtime in self.dir_mtimes.items():
+            try:
+                if os.stat(dpath).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                if mtime is not None:
+                    return False
+        return True
+
+    def get_tree(self):
+        """Return the manifest as a dict {dirname: [fname, ...]}."""
+        res = {}
+        for dirname, fnames in self.dirs:
+            res.setdefault(dirname, []).extend(fnames)
+        return res
+
+    def to_dict(self):
+        return {
+            "backup_items": self.backup_items,
+            "dirs": self.dirs,
+            "dir_mtimes": self.dir_mtimes,
+            "total_files": self.total_files,
+            "total_bytes": self.total_bytes,
+            "zip_size": self.zip_size,
+            "created": self.created
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+# ------------------------------------------------------------------------------
+# Backup Planner
+# ------------------------------------------------------------------------------
+
+
+class BackupPlanner:
+    """
+    Keeps the backup plan for a list of backup items, cached in memory and in
+    the webconf cache directory. The plan is walked again only when the backup
+    items change or when any of the walked directories has changed.
+    """
+
+    def __init__(self, name):
+        self.fpath = f"{CACHE_DIR}/backup_plan_{name}.json"
+        self.lock = threading.Lock()
+        self.plan = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.fpath) as f:
+                self.plan = BackupPlan.from_dict(json.load(f))
+        except FileNotFoundError:
+            self.plan = None
+        except Exception as e:
+            logging.warning(f"Can't load backup plan '{self.fpath}' => {e}")
+            self.plan = None
+
+    def save(self):
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_fpath = self.fpath + ".tmp"
+            with open(tmp_fpath, "w") as f:
+                json.dump(self.plan.to_dict(), f)
+            os.replace(tmp_fpath, self.fpath)
+        except Exception as e:
+            logging.warning(f"Can't save backup plan '{self.fpath}' => {e}")
+
+    def get_plan(self, backup_items):
+        """Return the plan for the backup items, walking the backup dirs only if needed. Blocking!"""
+        with self.lock:
+            if self.plan is None or self.plan.backup_items != list(backup_items) or not self.plan.is_valid():
+                self.plan = BackupPlan.walk(backup_items)
+                self.save()
+            return self.plan
+
+
+config_backup_planner = BackupPlanner("config")
+data_backup_planner = BackupPlanner("data")
+
+# ------------------------------------------------------------------------------
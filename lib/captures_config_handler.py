@@ -30,13 +30,27 @@ import mutagen
 import fnmatch
 import logging
 import jsonpickle
-import subprocess
 import tornado.web
 from zipfile import ZipFile
 
-from lib.upload_handler import TMP_DIR
+from lib.file_download import send_file, send_zip
+from lib.file_info_cache import FileInfoCache
 from lib.zynthian_config_handler import ZynthianBasicHandler
 
+# ------------------------------------------------------------------------------
+# Captures metadata: media durations, keyed by path+mtime+size
+# ------------------------------------------------------------------------------
+
+capture_durations = FileInfoCache("capture_durations")
+
+
+def get_media_length(fpath):
+    try:
+        return mutagen.File(fpath).info.length
+    except Exception as e:
+        logging.warning(e)
+        return None
+
 # ------------------------------------------------------------------------------
 # Soundfont Configuration
 # ------------------------------------------------------------------------------
@@ -44,6 +58,7 @@ from lib.zynthian_config_handler import ZynthianBasicHandler
 
 class CapturesConfigHandler(ZynthianBasicHandler):
     CAPTURES_DIRECTORY = "/zynthian/zynthian-my-data/capture"
+    CAPTURES_EXTENSIONS = ('wav', 'ogg', 'mp3', 'm3u', 'mid', 'log')
 
     selectedTreeNode = 0
     selected_full_path = ''
@@ -51,19 +66,20 @@ class CapturesConfigHandler(ZynthianBasicHandler):
     maxTreeNodeIndex = 0
 
     @tornado.web.authenticated
-    def get(self, errors=None):
+    async def get(self, errors=None):
         config = {}
         self.maxTreeNodeIndex = 0
         if self.get_argument('stream', None, True):
-            self.do_download(self.get_argument('stream').replace("%27", "'"))
+            await self.do_download(self.get_argument('stream').replace("%27", "'"))
         else:
+            # Scan the capture directory once, bucketing files by extension
+            entries = self.scan_directory(CapturesConfigHandler.CAPTURES_DIRECTORY)
             captures = []
-            captures.append(self.create_node('wav'))
-            captures.append(self.create_node('ogg'))
-            captures.append(self.create_node('mp3'))
-            captures.append(self.create_node('m3u'))
-            captures.append(self.create_node('mid'))
-            captures.append(self.create_node('log'))
+            for fext in self.CAPTURES_EXTENSIONS:
+                captures.append(self.create_node(fext, entries[fext]))
+            # Forget durations of captures removed from outside webconf
+            capture_durations.purge()
+            capture_durations.save()
 
             config['ZYNTHIAN_CAPTURES'] = json.dumps(captures)
             config['ZYNTHIAN_CAPTURES_SELECTION_NODE_ID'] = self.selectedTreeNode | 0
@@ -71,24 +87,25 @@ class CapturesConfigHandler(ZynthianBasicHandler):
 
             super().get("captures.html", "Captures", config, errors)
 
-    def post(self):
+    async def post(self):
         action = self.get_argument('ZYNTHIAN_CAPTURES_ACTION', None)
         if not action and self.get_argument('INSTALL_FPATH', None):
             action = 'UPLOAD'
         self.selected_full_path = self.get_argument(
             'ZYNTHIAN_CAPTURES_FULLPATH').replace("%27", "'")
-        if action:
+        if action == 'DOWNLOAD':
+            await self.do_download(self.get_argument('ZYNTHIAN_CAPTURES_FULLPATH'))
+        elif action:
             errors = {
                 'REMOVE': lambda: self.do_remove(),
                 'RENAME': lambda: self.do_rename(),
-                'DOWNLOAD': lambda: self.do_download(self.get_argument('ZYNTHIAN_CAPTURES_FULLPATH')),
                 'CONVERT_OGG': lambda: self.do_convert_ogg(),
                 'UPLOAD': lambda: self.do_install_file(),
                 'SAVE_LOG': lambda: self.do_save_log()
             }[action]()
 
         if (action not in ('DOWNLOAD', 'SAVE_LOG')):
-            self.get(errors)
+            await self.get(errors)
 
     def do_remove(self):
         logging.info("Removing {}".format(self.selected_full_path))
@@ -97,6 +114,7 @@ class CapturesConfigHandler(ZynthianBasicHandler):
                 shutil.rmtree(self.selected_full_path)
             else:
                 os.remove(self.selected_full_path)
+                capture_durations.remove(self.selected_full_path)
                 fparts = os.path.splitext(self.selected_full_path)
                 if fparts[1] == ".log":
                     video_fpath = fparts[0] + ".mp4"
@@ -137,6 +155,7 @@ class CapturesConfigHandler(ZynthianBasicHandler):
             logging.info("Renaming capture: {} => {}".format(
                 src_fpath, dest_fpath))
             shutil.move(src_fpath, dest_fpath)
+            capture_durations.move(src_fpath, dest_fpath)
             self.selected_full_path = dest_fpath
             # When renaming log files, change title inside log file and rename associated video file (mp4)
             if fext == ".log":
@@ -147,40 +166,29 @@ class CapturesConfigHandler(ZynthianBasicHandler):
                     src_fpath, dest_fpath))
                 shutil.move(src_fpath, dest_fpath)
 
-    def do_download(self, fullpath):
+    async def do_download(self, fullpath):
         if fullpath:
             fparts = os.path.split(fullpath)
             dirpath = fparts[0]
             filename = fparts[1]
 
-            # If file is a capture log, generate download package with log + video
-            fparts = os.path.splitext(filename)
-            if fparts[1] == ".log":
-                filename = fparts[0] + ".zip"
-                fullpath = TMP_DIR + "/" + filename
-                with ZipFile(fullpath, 'w') as tmpzip:
-                    tmpzip.write(dirpath + "/" +
-                                 fparts[0] + ".log", fparts[0] + ".log")
-                    tmpzip.write(dirpath + "/" +
-                                 fparts[0] + ".mp4", fparts[0] + ".mp4")
-
-            with open(fullpath, 'rb') as f:
-                try:
-                    while True:
-                        data = f.read(4096)
-                        if not data:
-                            break
-                        self.write(data)
-
-                    self.set_header(
-                        'Content-Type', self.get_content_type(filename))
-                    self.set_header('Content-Disposition',
-                                    'attachment; filename="%s"' % filename)
-                    self.finish()
-                except Exception as exc:
-                    logging.error(exc)
-                    self.set_header('Content-Type', 'application/json')
-                    self.write(jsonpickle.encode({'data': format(exc)}))
+            try:
+                # If file is a capture log, zip log + video on the fly
+                fparts = os.path.splitext(filename)
+                if fparts[1] == ".log":
+                    if not os.path.isfile(fullpath):
+                        raise FileNotFoundError("No such file: '{}'".format(fullpath))
+                    entries = [(fullpath, filename)]
+                    video_fpath = dirpath + "/" + fparts[0] + ".mp4"
+                    if os.path.isfile(video_fpath):
+                        entries.append((video_fpath, fparts[0] + ".mp4"))
+                    await send_zip(self, fparts[0] + ".zip", entries)
+                else:
+                    await send_file(self, fullpath, filename, self.get_content_type(filename) or "application/octet-stream")
+            except Exception as exc:
+                logging.error(exc)
+                self.set_header('Content-Type', 'application/json')
+                self.write(jsonpickle.encode({'data': format(exc)}))
 
     def do_install_file(self):
         result = {}
@@ -197,14 +205,16 @@ class CapturesConfigHandler(ZynthianBasicHandler):
 
     def do_convert_ogg(self):
         ogg_file_name = os.path.splitext(self.selected_full_path)[0]+'.ogg'
-        cmd = 'oggenc "{}" -o "{}"'.format(
-            self.selected_full_path, ogg_file_name)
-        try:
-            logging.info(cmd)
-            subprocess.check_output(cmd, stderr=subprocess.STDOUT, shell=True)
-        except Exception as e:
-            return e.output
-        return
+        self.start_job("convert_ogg_" + self.selected_full_path, self.convert_ogg, self.selected_full_path, ogg_file_name,
+            title="Converting {} to OGG".format(os.path.basename(self.selected_full_path)))
+
+    @staticmethod
+    def convert_ogg(job, wav_fpath, ogg_fpath):
+        cmd = ['oggenc', wav_fpath, '-o', ogg_fpath]
+        logging.info(cmd)
+        # oggenc progress lines => "[ 45.3%] [ 0m02s remaining] |"
+        if job.run_command(cmd, shell=False, progress_re=r"^\s*\[\s*([\d.]+)%\]") != 0:
+            return job.last_line
 
     def do_save_log(self):
         capture_log = self.get_argument('ZYNTHIAN_CAPTURES_LOG_CONTENT')
@@ -279,8 +289,7 @@ class CapturesConfigHandler(ZynthianBasicHandler):
         elif fext == '.zip':
             return 'application/zip'
 
-    def create_node(self, file_extension):
-        captures = []
+    def create_node(self, file_extension, entries):
         root_capture = {
             'text': file_extension,
             'name': file_extension,
@@ -290,11 +299,12 @@ class CapturesConfigHandler(ZynthianBasicHandler):
         }
         self.maxTreeNodeIndex += 1
 
-        try:
-            captures.extend(self.walk_directory(
-                CapturesConfigHandler.CAPTURES_DIRECTORY, 'fa fa-fw fa-file', file_extension))
-        except:
-            pass
+        captures = []
+        for entry in entries:
+            try:
+                captures.append(self.create_capture_node(entry, 'fa fa-fw fa-file', file_extension))
+            except Exception as e:
+                logging.warning(e)
         root_capture['nodes'] = captures
         return root_capture
 
@@ -312,53 +322,42 @@ class CapturesConfigHandler(ZynthianBasicHandler):
                 fzip.extractall(CapturesConfigHandler.CAPTURES_DIRECTORY)
             os.remove(destination)
 
-    def walk_directory(self, directory, icon, file_extension):
-        captures = []
-        logging.info("Getting {} filelist from {}".format(
-            file_extension, directory))
-        for f in sorted(os.listdir(directory)):
-            fname, fext = os.path.splitext(f)
-            if len(fext) > 0:
-                fext = fext[1:]
-
-            # logging.debug("{} => {}".format(fname,fext))
-            if fext.lower() != file_extension.lower():
-                continue
-
-            fullPath = os.path.join(directory, f)
-            logging.debug(fullPath)
-            # m = re.match('.*/(.*)', fullPath, re.M | re.I | re.S)
-            # text = ''
-            # if m:
-            # text = m.group(1)
-
-            try:
-                if self.selected_full_path == fullPath:
-                    self.selectedTreeNode = self.maxTreeNodeIndex  # max is current right now
-            except:
-                pass
-
-            text = f.replace("'", "&#39;")
-            if fext.lower() != 'log':
-                try:
-                    l = mutagen.File(fullPath).info.length
-                    text = "{} [{}:{:02d}]".format(
-                        f.replace("'", "&#39;"), int(l/60), int(l % 60))
-                except Exception as e:
-                    logging.warning(e)
-
-            capture = {
-                'text': text,
-                'name': f.replace("'", "&#39;"),
-                'fext': fext,
-                'fullpath': fullPath.replace("'", "&#39;"),
-                'icon': icon,
-                'id': self.maxTreeNodeIndex
-            }
-            self.maxTreeNodeIndex += 1
-            if os.path.isdir(fullPath):
-                capture['nodes'] = self.walk_directory(
-                    os.path.join(directory, f), icon)
-            captures.append(capture)
-
-        return captures
+    def scan_directory(self, directory):
+        entries = {fext: [] for fext in self.CAPTURES_EXTENSIONS}
+        logging.info("Getting capture filelist from {}".format(directory))
+        try:
+            for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+                fext = os.path.splitext(entry.name)[1][1:].lower()
+                if fext in entries and entry.is_file():
+                    entries[fext].append(entry)
+        except Exception as e:
+            logging.error("Can't scan capture directory {} => {}".format(directory, e))
+        return entries
+
+    def create_capture_node(self, entry, icon, file_extension):
+        f = entry.name
+        fullPath = entry.path
+        fext = os.path.splitext(f)[1][1:]
+        logging.debug(fullPath)
+
+        if self.selected_full_path == fullPath:
+            self.selectedTreeNode = self.maxTreeNodeIndex  # max is current right now
+
+        text = f.replace("'", "&#39;")
+        if file_extension != 'log':
+            # Duration is cached, so mutagen only runs for new or modified files
+            l = capture_durations.get(fullPath, get_media_length, entry.stat())
+            if l is not None:
+                text = "{} [{}:{:02d}]".format(
+                    f.replace("'", "&#39;"), int(l/60), int(l % 60))
+
+        capture = {
+            'text': text,
+            'name': f.replace("'", "&#39;"),
+            'fext': fext,
+            'fullpath': fullPath.replace("'", "&#39;"),
+            'icon': icon,
+            'id': self.maxTreeNodeIndex
+        }
+        self.maxTreeNodeIndex += 1
+        return capture
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Change-aware Configuration Cache
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+import os
+import logging
+import threading
+
+import zynconf
+import zyngine.zynthian_lv2 as zynthian_lv2
+
+# ------------------------------------------------------------------------------
+# Backing files
+# ------------------------------------------------------------------------------
+
+config_dir = os.environ.get('ZYNTHIAN_CONFIG_DIR', "/zynthian/config")
+
+
+def get_envars_fpath():
+    return getattr(zynconf, "config_fpath", config_dir + "/zynthian_envars.sh")
+
+
+def get_midi_config_fpath():
+    return zynconf.get_midi_config_fpath()
+
+
+def get_engines_fpath():
+    return getattr(zynthian_lv2, "ENGINE_CONFIG_FILE", config_dir + "/engine_config.json")
+
+
+def get_file_signature(fpath):
+    """Return a (inode, size, mtime) tuple identifying the file's content version, or None if it doesn't exist."""
+    try:
+        st = os.stat(fpath)
+        return st.st_ino, st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+# ------------------------------------------------------------------------------
+# Config Cache
+# ------------------------------------------------------------------------------
+
+
+class ConfigCache:
+    """
+    Process-wide cache of the configuration structures loaded by zynconf & zynthian_lv2.
+    Every source is reloaded only when its backing file changes (inode, size or mtime)
+    or when it has been explicitly invalidated.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Sources are refreshed in order: MIDI profile path depends on the envars!
+        self.sources = {
+            "config": (get_envars_fpath, zynconf.load_config),
+            "midi_config": (get_midi_config_fpath, zynconf.load_midi_config),
+            "engines": (get_engines_fpath, zynthian_lv2.load_engines)
+        }
+        # MIDI profile envars must be re-applied after reloading the main envars
+        self.depends = {"midi_config": "config"}
+        self.signatures = {}
+        self.versions = dict.fromkeys(self.sources, 0)
+        self.hits = dict.fromkeys(self.sources, 0)
+        self.reloads = dict.fromkeys(self.sources, 0)
+        # Sources being rewritten by a background job, not reloaded meanwhile
+        self.held = set()
+
+    def refresh(self):
+        with self.lock:
+            reloaded = []
+            for name, (get_fpath, loader) in self.sources.items():
+                try:
+                    fpath = get_fpath()
+                    signature = (fpath, get_file_signature(fpath))
+                except Exception as e:
+                    logging.warning(f"Can't check config source '{name}': {e}")
+                    signature = None
+                if name in self.held or (self.depends.get(name) not in reloaded and signature is not None and self.signatures.get(name) == signature):
+                    self.hits[name] += 1
+                    continue
+                logging.debug(f"Reloading config source '{name}' ...")
+                loader()
+                self.signatures[name] = signature
+                self.versions[name] += 1
+                self.reloads[name] += 1
+                reloaded.append(name)
+            if reloaded:
+                logging.debug(f"Config cache stats: {self.get_stats()}")
+
+    def hold(self, name):
+        """Don't reload a source while it's being changed by another thread, until released."""
+        with self.lock:
+            self.held.add(name)
+
+    def release(self, name):
+        with self.lock:
+            self.held.discard(name)
+
+    def invalidate(self, name=None):
+        """Force reloading a source (or all of them) on next refresh."""
+        with self.lock:
+            if name:
+                self.signatures.pop(name, None)
+            else:
+                self.signatures.clear()
+
+    def get_version(self, name):
+        """Return a counter that increases every time the source is reloaded."""
+        return self.versions[name]
+
+    def get_stats(self):
+        return {
+            "hits": dict(self.hits),
+            "reloads": dict(self.reloads)
+        }
+
+
+config_cache = ConfigCache()
+
+# ------------------------------------------------------------------------------
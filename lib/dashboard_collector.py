@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Dashboard Data Collector
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# ------------------------------------------------------------------------------
+# Dashboard Probe
+# ------------------------------------------------------------------------------
+
+
+class DashboardProbe:
+    """
+    A blocking data getter with its own time-to-live.
+    The last collected value is kept and served while a refresh is running.
+    """
+
+    def __init__(self, name, func, ttl, args=(), default=None):
+        self.name = name
+        self.func = func
+        self.ttl = ttl
+        self.args = args
+        self.default = default
+        self.value = default
+        self.timestamp = None
+        self.future = None
+
+    def has_value(self):
+        return self.timestamp is not None
+
+    def is_stale(self, now):
+        return self.timestamp is None or now - self.timestamp >= self.ttl
+
+    def refresh(self, executor):
+        # Reuse the running refresh, if any
+        if self.future is None:
+            loop = asyncio.get_running_loop()
+            self.future = loop.run_in_executor(executor, self.run)
+            self.future.add_done_callback(self.on_done)
+        return self.future
+
+    def run(self):
+        try:
+            return self.func(*self.args)
+        except Exception as e:
+            logging.warning(f"Dashboard probe '{self.name}' failed => {e}")
+            return self.default
+
+    def on_done(self, future):
+        self.future = None
+        if not future.cancelled():
+            self.value = future.result()
+            self.timestamp = time.monotonic()
+
+# ------------------------------------------------------------------------------
+# Dashboard Collector
+# ------------------------------------------------------------------------------
+
+
+class DashboardCollector:
+    """
+    Runs the dashboard probes concurrently in a thread pool, out of the IOLoop.
+    Fresh values are served from cache, stale values are served while refreshing
+    in background and only probes that never returned a value are waited for.
+    """
+
+    def __init__(self, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dashboard")
+        self.probes = {}
+
+    def add_probe(self, name, func, ttl, *args, default=None):
+        """Register a probe, if it's not already registered. Return the probe name."""
+        if name not in self.probes:
+            self.probes[name] = DashboardProbe(name, func, ttl, args, default)
+        return name
+
+    async def collect(self, names=None):
+        """Return a snapshot dictionary with the values of the requested probes (all by default)."""
+        if names is None:
+            names = list(self.probes)
+        now = time.monotonic()
+        waiting = []
+        for name in names:
+            probe = self.probes[name]
+            if probe.is_stale(now):
+                future = probe.refresh(self.executor)
+                if not probe.has_value():
+                    waiting.append(future)
+        if waiting:
+            await asyncio.gather(*waiting, return_exceptions=True)
+        return {name: self.probes[name].value for name in names}
+
+# ------------------------------------------------------------------------------
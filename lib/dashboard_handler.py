@@ -24,13 +24,15 @@
 
 import zynconf
 import os
-import re
 import sys
 import logging
 import tornado.web
 from distutils import util
 from subprocess import check_output, DEVNULL
+from lib import system_metrics
+from lib.service_state import service_state
 from lib.zynthian_config_handler import ZynthianBasicHandler
+from lib.dashboard_collector import DashboardCollector
 
 sys.path.append(os.environ.get('ZYNTHIAN_UI_DIR'))
 
@@ -42,20 +44,30 @@ sys.path.append(os.environ.get('ZYNTHIAN_UI_DIR'))
 class DashboardHandler(ZynthianBasicHandler):
 
     @tornado.web.authenticated
-    def get(self):
+    async def get(self):
+        # Register a probe for every mounted external storage
+        ex_data_basedir = os.environ.get('ZYNTHIAN_EX_DATA_DIR', "/media/root")
+        ex_data_dirs = zynconf.get_external_storage_dirs(ex_data_basedir)
+        media_probes = {}
+        for exdir in ex_data_dirs:
+            media_probes[exdir] = dashboard_collector.add_probe("media_info:" + exdir, self.get_media_info, MEDIA_INFO_TTL, exdir)
+
+        # Collect data concurrently, out of the IOLoop
+        data = await dashboard_collector.collect(DASHBOARD_PROBES + list(media_probes.values()))
+
         # Get git info
-        git_info_zyncoder = self.get_git_info("/zynthian/zyncoder")
-        git_info_ui = self.get_git_info("/zynthian/zynthian-ui")
-        git_info_sys = self.get_git_info("/zynthian/zynthian-sys")
-        git_info_webconf = self.get_git_info("/zynthian/zynthian-webconf")
-        git_info_data = self.get_git_info("/zynthian/zynthian-data")
+        git_info_zyncoder = data['git_info_zyncoder']
+        git_info_ui = data['git_info_ui']
+        git_info_sys = data['git_info_sys']
+        git_info_webconf = data['git_info_webconf']
+        git_info_data = data['git_info_data']
 
         # Get Memory & SD Card info
-        ram_info = self.get_ram_info()
-        root_info = self.get_root_info()
+        ram_info = data['ram_info']
+        root_info = data['root_info']
 
         # get I2C chips info
-        i2c_chips = self.get_i2c_chips()
+        i2c_chips = data['i2c_chips']
         if len(i2c_chips) > 0:
             i2c_info = ", ".join(map(str, i2c_chips))
         else:
@@ -96,11 +108,11 @@ class DashboardHandler(ZynthianBasicHandler):
                 'icon': 'glyphicon glyphicon-tasks',
                         'info': {
                             'OS_INFO': {
-                                'title': "{}".format(self.get_os_info())
+                                'title': "{}".format(data['os_info'])
                             },
                             'BUILD_DATE': {
                                 'title': 'Build Date',
-                                'value': self.get_build_info()['Timestamp'],
+                                'value': data['build_info'].get('Timestamp', '???'),
                             },
                             'RAM': {
                                 'title': 'Memory',
@@ -112,7 +124,7 @@ class DashboardHandler(ZynthianBasicHandler):
                             },
                             'TEMPERATURE': {
                                 'title': 'Temperature',
-                                'value': self.get_temperature()
+                                'value': data['temperature']
                             },
                             'OVERCLOCKING': {
                                 'title': 'Overclock',
@@ -191,27 +203,27 @@ class DashboardHandler(ZynthianBasicHandler):
                 'info': {
                     'SNAPSHOTS': {
                         'title': 'Snapshots',
-                        'value': str(self.get_num_of_files(os.environ.get('ZYNTHIAN_MY_DATA_DIR')+"/snapshots")),
+                        'value': str(data['num_snapshots']),
                         'url': "/lib-snapshot"
                     },
                     'USER_PRESETS': {
                         'title': 'User Presets',
-                        'value': str(self.get_num_of_presets(os.environ.get('ZYNTHIAN_MY_DATA_DIR')+"/presets")),
+                        'value': str(data['num_presets']),
                         'url': "/lib-presets"
                     },
                     'USER_SOUNDFONTS': {
                         'title': 'User Soundfonts',
-                        'value': str(self.get_num_of_files(os.environ.get('ZYNTHIAN_MY_DATA_DIR')+"/soundfonts")),
+                        'value': str(data['num_soundfonts']),
                         'url': "/lib-soundfont"
                     },
                     'AUDIO_CAPTURES': {
                         'title': 'Audio Captures',
-                        'value': str(self.get_num_of_files(os.environ.get('ZYNTHIAN_MY_DATA_DIR')+"/capture", "*.wav")),
+                        'value': str(data['num_audio_captures']),
                         'url': "/lib-captures"
                     },
                     'MIDI_CAPTURES': {
                         'title': 'MIDI Captures',
-                        'value': str(self.get_num_of_files(os.environ.get('ZYNTHIAN_MY_DATA_DIR')+"/capture", "*.mid")),
+                        'value': str(data['num_midi_captures']),
                         'url': "/lib-captures"
                     }
                 }
@@ -221,17 +233,17 @@ class DashboardHandler(ZynthianBasicHandler):
                 'info': {
                     'HOSTNAME': {
                         'title': 'Hostname',
-                        'value': self.get_host_name(),
+                        'value': data['host_name'],
                         'url': "/sys-security"
                     },
                     'WIFI': {
                         'title': 'Wifi',
-                        'value': zynconf.get_nwdev_status_string("wlan0"),
+                        'value': data['wifi_status'],
                         # 'url': "/sys-wifi"
                     },
                     'IP': {
                         'title': 'IP',
-                        'value': self.get_ip(),
+                        'value': data['ip'],
                         # 'url': "/sys-wifi"
                     },
                     'VNC': {
@@ -241,7 +253,7 @@ class DashboardHandler(ZynthianBasicHandler):
                     },
                     'MIDI': {
                         'title': 'MIDI Services',
-                        'value': self.get_midi_network_services()
+                        'value': data['midi_network_services']
                     }
                 }
             }
@@ -254,10 +266,8 @@ class DashboardHandler(ZynthianBasicHandler):
                 'url': "/hw-wiring"
             }
 
-        ex_data_basedir = os.environ.get('ZYNTHIAN_EX_DATA_DIR', "/media/root")
-        ex_data_dirs = zynconf.get_external_storage_dirs(ex_data_basedir)
-        for exdir in ex_data_dirs:
-            media_info = self.get_media_info(exdir)
+        for exdir, probe_name in media_probes.items():
+            media_info = data[probe_name]
             if media_info:
                 dname = os.path.basename(exdir)
                 config['SYSTEM']['info']['MEDIA_' + dname] = {
@@ -266,7 +276,7 @@ class DashboardHandler(ZynthianBasicHandler):
                     'url': "/lib-captures"
                 }
 
-        if self.is_service_active("touchosc2midi"):
+        if data['touchosc_active']:
             config['NETWORK']['info']['TOUCHOSC'] = {
                 'title': 'TouchOSC',
                 'value': 'on',
@@ -290,9 +300,7 @@ class DashboardHandler(ZynthianBasicHandler):
 
     @staticmethod
     def get_host_name():
-        with open("/etc/hostname") as f:
-            hostname = f.readline()
-            return hostname
+        return system_metrics.get_host_name()
 
     @staticmethod
     def get_os_info():
@@ -321,13 +329,7 @@ class DashboardHandler(ZynthianBasicHandler):
 
     @staticmethod
     def get_ip():
-        # out=check_output("hostname -I | cut -f1 -d' '", shell=True).decode()
-        ips = []
-        for ip in check_output("hostname -I", shell=True).decode().split(" "):
-            # Filter ip6 addresses
-            if '.' in ip:
-                ips.append(ip)
-        return " ".join(ips)
+        return system_metrics.get_ip()
 
     @staticmethod
     def get_i2c_chips():
@@ -357,46 +359,30 @@ class DashboardHandler(ZynthianBasicHandler):
 
     @staticmethod
     def get_ram_info():
-        out = check_output("free -m | grep 'Mem'", shell=True).decode()
-        parts = re.split('\s+', out)
-        return {'total': parts[1]+"M", 'used': parts[2]+"M", 'free': parts[3]+"M", 'usage': "{}%".format(int(100*float(parts[2])/float(parts[1])))}
+        return system_metrics.get_ram_info()
 
     @staticmethod
     def get_temperature():
-        try:
-            return check_output("vcgencmd measure_temp", shell=True).decode()[5:-3] + "ºC"
-        except:
-            return "???"
+        return system_metrics.get_temperature()
 
     @staticmethod
     def get_volume_info(volume=None):
         if volume is None:
-            volume = "/dev/mmcblk0p2\|/dev/root"
-        try:
-            out = check_output(
-                "df -hT | grep '{}'".format(volume), shell=True).decode()
-            parts = re.split('\s+', out)
-            return {'fs': parts[1], 'total': parts[2], 'used': parts[3], 'free': parts[4], 'usage': parts[5]}
-        except:
-            return {'fs': 'NA', 'total': 'NA', 'used': 'NA', 'free': 'NA', 'usage': 'NA'}
+            volume = "/"
+        return system_metrics.get_volume_info(volume)
 
     @staticmethod
     def get_root_device():
-        return check_output("findmnt -n -o SOURCE /", encoding="utf-8", shell=True).strip()
+        return system_metrics.get_root_device()
 
     @staticmethod
     def get_root_info():
-        return DashboardHandler.get_volume_info(DashboardHandler.get_root_device())
+        return system_metrics.get_volume_info("/")
 
     @staticmethod
     def get_media_info(mpath="/media/usb0"):
         try:
-            out = check_output("mountpoint '{}'".format(
-                mpath), shell=True).decode()
-            if out.startswith("{} is a mountpoint".format(mpath)):
-                return DashboardHandler.get_volume_info(mpath)
-            else:
-                return None
+            return system_metrics.get_media_info(mpath)
         except Exception as e:
             # logging.error("Can't get info for '{}' => {}".format(mpath,e))
             pass
@@ -456,17 +442,8 @@ class DashboardHandler(ZynthianBasicHandler):
         return ", ".join(res)
 
     @staticmethod
-    def is_service_active(service):
-        cmd = "systemctl is-active %s" % service
-        try:
-            result = check_output(cmd, shell=True).decode('utf-8', 'ignore')
-        except Exception as e:
-            result = "ERROR: %s" % e
-        # print("Is service "+str(service)+" active? => "+str(result))
-        if result.strip() == 'active':
-            return True
-        else:
-            return False
+    def is_service_active(service, max_age=None):
+        return service_state.is_active(service, max_age)
 
     @staticmethod
     def bool2onoff(b):
@@ -474,3 +451,54 @@ class DashboardHandler(ZynthianBasicHandler):
             return "On"
         else:
             return "Off"
+
+# ------------------------------------------------------------------------------
+# Dashboard Data Probes
+# ------------------------------------------------------------------------------
+
+# Time-to-live (seconds) for every kind of dashboard data
+GIT_INFO_TTL = 600
+HARDWARE_INFO_TTL = 3600
+OS_INFO_TTL = 3600
+LIBRARY_INFO_TTL = 60
+MEDIA_INFO_TTL = 30
+NETWORK_INFO_TTL = 10
+SERVICE_INFO_TTL = 5
+SYSTEM_STATUS_TTL = 5
+
+dashboard_collector = DashboardCollector()
+
+
+def _add_dashboard_probes():
+    my_data_dir = os.environ.get('ZYNTHIAN_MY_DATA_DIR', "/zynthian/zynthian-my-data")
+    git_info_default = {"branch": "???", "gitid": "", "update": None}
+    volume_info_default = {'fs': 'NA', 'total': 'NA', 'used': 'NA', 'free': 'NA', 'usage': 'NA'}
+    add = dashboard_collector.add_probe
+    return [
+        add('git_info_zyncoder', DashboardHandler.get_git_info, GIT_INFO_TTL, "/zynthian/zyncoder", default=git_info_default),
+        add('git_info_ui', DashboardHandler.get_git_info, GIT_INFO_TTL, "/zynthian/zynthian-ui", default=git_info_default),
+        add('git_info_sys', DashboardHandler.get_git_info, GIT_INFO_TTL, "/zynthian/zynthian-sys", default=git_info_default),
+        add('git_info_webconf', DashboardHandler.get_git_info, GIT_INFO_TTL, "/zynthian/zynthian-webconf", default=git_info_default),
+        add('git_info_data', DashboardHandler.get_git_info, GIT_INFO_TTL, "/zynthian/zynthian-data", default=git_info_default),
+        add('i2c_chips', DashboardHandler.get_i2c_chips, HARDWARE_INFO_TTL, default=[]),
+        add('os_info', DashboardHandler.get_os_info, OS_INFO_TTL, default="???"),
+        add('build_info', DashboardHandler.get_build_info, OS_INFO_TTL, default={}),
+        add('ram_info', DashboardHandler.get_ram_info, SYSTEM_STATUS_TTL, default=volume_info_default),
+        add('root_info', DashboardHandler.get_root_info, MEDIA_INFO_TTL, default=volume_info_default),
+        add('temperature', DashboardHandler.get_temperature, SYSTEM_STATUS_TTL, default="???"),
+        add('num_snapshots', DashboardHandler.get_num_of_files, LIBRARY_INFO_TTL, my_data_dir + "/snapshots", default=0),
+        add('num_presets', DashboardHandler.get_num_of_presets, LIBRARY_INFO_TTL, my_data_dir + "/presets", default=0),
+        add('num_soundfonts', DashboardHandler.get_num_of_files, LIBRARY_INFO_TTL, my_data_dir + "/soundfonts", default=0),
+        add('num_audio_captures', DashboardHandler.get_num_of_files, LIBRARY_INFO_TTL, my_data_dir + "/capture", "*.wav", default=0),
+        add('num_midi_captures', DashboardHandler.get_num_of_files, LIBRARY_INFO_TTL, my_data_dir + "/capture", "*.mid", default=0),
+        add('host_name', DashboardHandler.get_host_name, NETWORK_INFO_TTL, default="???"),
+        add('wifi_status', zynconf.get_nwdev_status_string, NETWORK_INFO_TTL, "wlan0", default="???"),
+        add('ip', DashboardHandler.get_ip, NETWORK_INFO_TTL, default=""),
+        add('midi_network_services', DashboardHandler.get_midi_network_services, SERVICE_INFO_TTL, default=""),
+        add('touchosc_active', DashboardHandler.is_service_active, SERVICE_INFO_TTL, "touchosc2midi", default=False)
+    ]
+
+
+DASHBOARD_PROBES = _add_dashboard_probes()
+
+# ------------------------------------------------------------------------------
@@ -117,9 +117,11 @@ class dsp56300Handler(ZynthianBasicHandler):
                 fname = os.path.basename(fpath)
                 logging.info(f"Moving {fname} to {roms_dpath} ...")
                 shutil.move(fpath, roms_dpath + "/" + fname)
-                # Generate presets
+                # Generate presets, as a background job
                 if gear_name in ("Osirus", "OsTIrus"):
-                    errors = self.generate_presets(plugin_uri)
+                    self.start_job(f"dsp56300_presets_{gear_name}", self.generate_presets, plugin_uri,
+                        title=f"Generating {gear_name} presets")
+                    errors = None
                 # Copy patchmanager config file
                 else:
                     pm_dpath = gear_path + "/patchmanager"
@@ -170,17 +172,21 @@ class dsp56300Handler(ZynthianBasicHandler):
         flist += list(glob.iglob("*.MID", root_dir=dpath)) + list(glob.iglob("*.mid", root_dir=dpath))
         return flist
 
-    def generate_presets(self, plugin_uri):
+    @staticmethod
+    def generate_presets(job, plugin_uri):
         errors = None
         command = f"jalv -n dsp53600_webconf \"{plugin_uri}\""
         try:
+            job.log(f"Loading plugin {plugin_uri} ...")
             proc = pexpect.spawn(command, timeout=10)
             proc.delaybeforesend = 0
             proc.expect("\n> ")
             proc.terminate(True)
-            res = check_output(f"regenerate_lv2_presets.sh {plugin_uri}", shell=True, stderr=STDOUT).decode("utf-8")
+            if job.run_command(f"regenerate_lv2_presets.sh {plugin_uri}") != 0:
+                errors = f"Can't generate presets for '{plugin_uri}': {job.last_line}"
         except Exception as e:
             errors = f"Can't generate presets for '{plugin_uri}': {e}"
+        if errors:
             logging.error(errors)
         return errors
 
@@ -22,14 +22,70 @@
 #
 # ********************************************************************
 
-import copy
 import json
 import logging
+import hashlib
+import threading
 import tornado.web
 
+from lib.config_cache import config_cache
+from lib.background_job import background_jobs
 from lib.zynthian_config_handler import ZynthianBasicHandler
 import zyngine.zynthian_lv2 as zynthian_lv2
 
+# Regenerate jobs mutate the engine dicts from a worker thread
+REGENERATE_JOB_KEYS = ("regenerate_engines", "regenerate_lv2_presets_cache")
+
+
+def is_regenerating():
+    for key in REGENERATE_JOB_KEYS:
+        job = background_jobs.find(key)
+        if job and job.is_running():
+            return True
+    return False
+
+# ------------------------------------------------------------------------------
+# Engine Catalogue, serialized for the browser
+# ------------------------------------------------------------------------------
+
+
+class EngineCatalogue:
+    """
+    Engine info & categories as JSON, with its ETag. It's built only when the
+    engines change, projecting the serializable keys instead of deep-copying.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.engines = None
+        self.data = None
+        self.etag = None
+
+    def invalidate(self):
+        with self.lock:
+            self.data = None
+
+    def get(self):
+        """Return (data, etag). The engines dict is replaced when engines are regenerated."""
+        with self.lock:
+            # Don't walk the engines while they are being regenerated, if there is a previous catalogue
+            if self.data is not None and is_regenerating():
+                return self.data, self.etag
+            if self.data is None or self.engines is not zynthian_lv2.engines:
+                self.engines = zynthian_lv2.engines
+                sengines = {}
+                for key, info in list(self.engines.items()):
+                    sengines[key] = {k: v for k, v in info.items() if k != 'ENGINE'}
+                self.data = json.dumps({
+                    'engines': sengines,
+                    'categories': zynthian_lv2.engine_categories
+                }).encode()
+                self.etag = '"{}"'.format(hashlib.sha1(self.data).hexdigest())
+            return self.data, self.etag
+
+
+engine_catalogue = EngineCatalogue()
+
 # ------------------------------------------------------------------------------
 # Engines Info & Configuration
 # ------------------------------------------------------------------------------
@@ -43,18 +99,6 @@ class EnginesHandler(ZynthianBasicHandler):
 
         config['ZYNTHIAN_ENGINES'] = zynthian_lv2.engines_by_type
         config['ZYNTHIAN_ENGINES_TYPE_TITLE'] = zynthian_lv2.engine_type_title
-
-        # Make a deep copy AND remove not serializable objects (ENGINE)
-        sengines = copy.deepcopy(zynthian_lv2.engines)
-        for key, info in sengines.items():
-            try:
-                del info['ENGINE']
-            except:
-                pass
-        config['ZYNTHIAN_ENGINES_JSON'] = json.JSONEncoder().encode(sengines)
-        config['ZYNTHIAN_ENGINE_CATS_JSON'] = json.JSONEncoder().encode(
-            zynthian_lv2.engine_categories)
-
         try:
             config['ZYNTHIAN_ACTIVE_TAB'] = self.get_argument(
                 'ZYNTHIAN_ACTIVE_TAB')
@@ -84,17 +128,29 @@ class EnginesHandler(ZynthianBasicHandler):
         action = self.get_argument('ZYNTHIAN_ENGINES_ACTION')
         logging.debug(f"Executing {action} ...")
         errors = None
+        engine_catalogue.invalidate()
         try:
             if action == "REGENERATE_ENGINES":
-                self.do_regenerate_engines()
+                self.start_job(REGENERATE_JOB_KEYS[0], self.do_regenerate_engines, title="Searching for engines")
             elif action == "REGENERATE_LV2_PRESETS_CACHE":
-                self.do_regenerate_lv2_presets_cache()
+                self.start_job(REGENERATE_JOB_KEYS[1], self.do_regenerate_lv2_presets_cache,
+                    title="Searching for presets")
         except Exception as e:
             errors = e
         self.get(errors)
 
+    def reject_while_regenerating(self):
+        """Engines can't be edited while a regenerate job is changing them"""
+        if is_regenerating():
+            self.set_status(409)
+            self.finish("Engines are being regenerated. Try again when finished.")
+            return True
+        return False
+
     @tornado.web.authenticated
     def put(self):
+        if self.reject_while_regenerating():
+            return
         ucargs = tornado.escape.recursive_unicode(self.request.arguments)
         # logging.debug(f"Saving engine info RAW => {ucargs}")
         eng_code = ucargs['ENGINE_CODE'][0]
@@ -132,9 +188,12 @@ class EnginesHandler(ZynthianBasicHandler):
                 zynthian_lv2.engines[eng_code]['EDIT'] = edit
             # logging.debug(f"Saving engine info => {zynthian_lv2.engines[eng_code]}")
             zynthian_lv2.save_engines()
+            engine_catalogue.invalidate()
 
     @tornado.web.authenticated
     def patch(self):
+        if self.reject_while_regenerating():
+            return
         ucargs = tornado.escape.recursive_unicode(self.request.arguments)
         eng_code = ucargs['ENGINE_CODE'][0]
         eng_enabled = bool(int(ucargs['ENGINE_ENABLED'][0]))
@@ -143,21 +202,55 @@ class EnginesHandler(ZynthianBasicHandler):
             zynthian_lv2.engines[eng_code]['EDIT'] = 1
         logging.debug(f"Engine '{eng_code}' => ENABLED={eng_enabled}")
         zynthian_lv2.save_engines()
+        engine_catalogue.invalidate()
+
+    # Run as background jobs
 
-    def do_regenerate_engines(self):
-        prev_engines = zynthian_lv2.engines.keys()
-        # Regenerate engine info file, searching for LV2 plugins
-        # zynthian_lv2.generate_engines_config_file(refresh=True, reset_rankings=None)
-        zynthian_lv2.update_engine_defaults(refresh=True)
-        zynthian_lv2.get_engines_by_type()
-        # Detect new LV2 plugins and generate presets cache for them
-        for key, info in zynthian_lv2.engines.items():
-            if key not in prev_engines and 'URL' in info and info['URL']:
+    @staticmethod
+    def do_regenerate_engines(job):
+        # Page views mustn't reload the engines from the config file meanwhile
+        config_cache.hold("engines")
+        try:
+            prev_engines = set(zynthian_lv2.engines.keys())
+            # Regenerate engine info file, searching for LV2 plugins
+            # zynthian_lv2.generate_engines_config_file(refresh=True, reset_rankings=None)
+            job.log("Searching for LV2 plugins ...")
+            zynthian_lv2.update_engine_defaults(refresh=True)
+            zynthian_lv2.get_engines_by_type()
+            engine_catalogue.invalidate()
+            # Detect new LV2 plugins and generate presets cache for them
+            new_engines = [info for key, info in zynthian_lv2.engines.items()
+                           if key not in prev_engines and 'URL' in info and info['URL']]
+            job.log(f"Found {len(new_engines)} new engines")
+            for i, info in enumerate(new_engines):
+                if job.is_cancelled():
+                    break
+                job.log(f"Generating presets cache for {info['URL']}")
+                job.report_progress(100 * i / len(new_engines))
                 zynthian_lv2.generate_plugin_presets_cache(info['URL'], False)
+        finally:
+            config_cache.release("engines")
 
-    def do_regenerate_lv2_presets_cache(self):
+    @staticmethod
+    def do_regenerate_lv2_presets_cache(job):
+        job.log("Searching for LV2 presets ...")
         zynthian_lv2.generate_presets_cache_workaround()
         zynthian_lv2.generate_all_presets_cache(refresh=False)
         # TODO => send CUIA to reload preset info on running JALV processors
 
+
+class EngineCatalogueHandler(ZynthianBasicHandler):
+    """Serves the engine catalogue JSON, supporting conditional GET (If-None-Match)"""
+
+    @tornado.web.authenticated
+    def get(self):
+        data, etag = engine_catalogue.get()
+        self.set_header("Content-Type", "application/json")
+        self.set_header("Cache-Control", "private, no-cache")
+        self.set_header("Etag", etag)
+        if self.check_etag_header():
+            self.set_status(304)
+        else:
+            self.write(data)
+
 # ------------------------------------------------------------------------------
@@ -26,7 +26,6 @@ import os
 import sys
 import logging
 import tornado.web
-from subprocess import check_output, STDOUT
 
 import zynconf
 from lib.zynthian_config_handler import ZynthianBasicHandler
@@ -91,22 +90,26 @@ class ExtraPacksHandler(ZynthianBasicHandler):
         if pack_name:
             try:
                 errors = self.do_install_package(pack_name)
-                self.restart_ui_flag = self.pack_info[pack_name]['restart_ui_flag']
             except Exception as err:
                 errors = f"Can't install package {pack_name}"
                 logging.error(err)
         self.get(errors)
 
     def do_install_package(self, pack_name):
-        errors = None
-        try:
-            recipe = self.pack_info[pack_name]['recipe']
-            res = check_output(f"$ZYNTHIAN_RECIPE_DIR/{recipe}", shell=True)
-        except Exception as e:
-            errors = f"Error installing '{pack_name}' => {e}"
-        if errors:
+        # Downloading & installing takes a while => run as a background job
+        title = self.pack_info[pack_name]['title']
+        self.start_job(f"extrapack_{pack_name}", self.install_package, pack_name, title=f"Installing {title}")
+
+    @classmethod
+    def install_package(cls, job, pack_name):
+        recipe = cls.pack_info[pack_name]['recipe']
+        if job.run_command(f"$ZYNTHIAN_RECIPE_DIR/{recipe}") != 0:
+            errors = f"Error installing '{pack_name}' => {job.last_line}"
             logging.error(errors)
-        return errors
+            return errors
+        if cls.pack_info[pack_name]['restart_ui_flag']:
+            job.log("Restarting UI ...")
+            job.run_command("systemctl restart zynthian")
 
     def get_config(self):
         # Check if Hydrogen_Drumkits is installed
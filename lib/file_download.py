@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Async File Download
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+
+import os
+import re
+import asyncio
+import logging
+import zipfile
+from email.utils import formatdate, parsedate_to_datetime
+from tornado.iostream import StreamClosedError
+
+from lib.zip_stream import ZipStream
+
+# Size of the blocks read from disk & flushed to the client
+CHUNK_SIZE = 256 * 1024
+
+# Already compressed (or not worth compressing) media is zipped in STORED mode
+STORED_EXTENSIONS = ('.wav', '.ogg', '.mp3', '.mp4', '.flac', '.sf2', '.sf3')
+
+# ------------------------------------------------------------------------------
+# Helpers
+# ------------------------------------------------------------------------------
+
+
+def get_etag(st):
+    return '"{:x}-{:x}"'.format(st.st_mtime_ns, st.st_size)
+
+
+def is_not_modified(request, etag, mtime):
+    """Check the conditional headers (If-None-Match has precedence over If-Modified-Since)"""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        return if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return False
+
+
+def parse_range(range_header, size):
+    """
+    Parse a single range "Range" header ("bytes=start-end", "bytes=start-" or "bytes=-suffix").
+    Return a (start, end) tuple, with end exclusive, None if the header is not usable
+    (=> full content) or False if the range can't be satisfied.
+    """
+    m = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header)
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) + 1 if m.group(2) else size
+        if start < size and end <= start:
+            return None
+    else:
+        # Suffix range: last N bytes
+        start = max(size - int(m.group(2)), 0)
+        end = size
+    if start >= size:
+        return False
+    return start, min(end, size)
+
+
+def get_compress_type(fpath):
+    if os.path.splitext(fpath)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def iter_dir_entries(dpath, arcbase=""):
+    """Yield (path, arcname) tuples for the content of a directory, with archive names relative to it."""
+    for dirname, subdirs, files in os.walk(dpath):
+        reldir = os.path.relpath(dirname, dpath)
+        if reldir == ".":
+            reldir = ""
+        else:
+            yield dirname, os.path.join(arcbase, reldir)
+        for fname in files:
+            yield os.path.join(dirname, fname), os.path.join(arcbase, reldir, fname)
+
+# ------------------------------------------------------------------------------
+# Download
+# ------------------------------------------------------------------------------
+
+
+async def send_file(handler, fpath, fname=None, mime_type="application/octet-stream", attachment=True):
+    """
+    Send a file from a tornado RequestHandler without blocking the IOLoop:
+    - disk reads run in the default executor, by blocks of CHUNK_SIZE
+    - every block is flushed before reading the next one, so memory is bounded
+    - supports single "Range" requests and conditional requests (ETag / Last-Modified)
+    Exceptions raised before sending anything (i.e. file not found) are propagated to the caller.
+    """
+    if fname is None:
+        fname = os.path.basename(fpath)
+    loop = asyncio.get_running_loop()
+    f = await loop.run_in_executor(None, open, fpath, "rb")
+    try:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        etag = get_etag(st)
+        handler.set_header("Content-Type", mime_type)
+        handler.set_header("Content-Description", "File Transfer")
+        if attachment:
+            handler.set_header("Content-Disposition", 'attachment; filename="{}"'.format(fname))
+        handler.set_header("Accept-Ranges", "bytes")
+        handler.set_header("ETag", etag)
+        handler.set_header("Last-Modified", formatdate(st.st_mtime, usegmt=True))
+
+        if is_not_modified(handler.request, etag, st.st_mtime):
+            handler.set_status(304)
+            handler.finish()
+            return
+
+        start, end = 0, size
+        range_header = handler.request.headers.get("Range")
+        if_range = handler.request.headers.get("If-Range")
+        if range_header and (not if_range or if_range.strip() == etag):
+            brange = parse_range(range_header, size)
+            if brange is False:
+                handler.set_status(416)
+                handler.set_header("Content-Range", "bytes */{}".format(size))
+                handler.clear_header("Content-Disposition")
+                handler.finish()
+                return
+            elif brange:
+                start, end = brange
+                handler.set_status(206)
+                handler.set_header("Content-Range", "bytes {}-{}/{}".format(start, end - 1, size))
+        handler.set_header("Content-Length", end - start)
+
+        if start:
+            f.seek(start)
+        remaining = end - start
+        try:
+            while remaining > 0:
+                data = await loop.run_in_executor(None, f.read, min(CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                handler.write(data)
+                await handler.flush()
+            handler.finish()
+        except StreamClosedError:
+            logging.debug("Download of '{}' cancelled by client".format(fpath))
+    finally:
+        f.close()
+
+
+async def send_zip(handler, fname, entries):
+    """
+    Send a list of files and directories as a zip archive, built on the fly in the response
+    stream. Nothing is written to disk. Entries are (path, arcname) tuples.
+    Compression runs in the default executor, by blocks of CHUNK_SIZE.
+    """
+    handler.set_header("Content-Type", "application/zip")
+    handler.set_header("Content-Description", "File Transfer")
+    handler.set_header("Content-Disposition", 'attachment; filename="{}"'.format(fname))
+    loop = asyncio.get_running_loop()
+    zs = ZipStream(CHUNK_SIZE, zipfile.ZIP_DEFLATED)
+    try:
+        for fpath, arcname in entries:
+            if os.path.isdir(fpath):
+                await write_chunk(handler, zs.add_dir(fpath, arcname))
+                continue
+            try:
+                chunks = zs.add_file(fpath, arcname, get_compress_type(fpath))
+                while True:
+                    chunk = await loop.run_in_executor(None, next, chunks, None)
+                    if chunk is None:
+                        break
+                    await write_chunk(handler, chunk)
+            except StreamClosedError:
+                raise
+            except OSError as e:
+                # Headers are already sent => skip the file
+                logging.error("Can't zip '{}' => {}".format(fpath, e))
+        await write_chunk(handler, zs.close())
+        handler.finish()
+    except StreamClosedError:
+        logging.debug("Download of '{}' cancelled by client".format(fname))
+
+
+async def write_chunk(handler, chunk):
+    if chunk:
+        handler.write(chunk)
+        await handler.flush()
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Persistent File Info Cache
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+import os
+import json
+import logging
+import threading
+
+CACHE_DIR = os.environ.get('ZYNTHIAN_WEBCONF_CACHE_DIR', "/var/cache/zynthian-webconf")
+
+# ------------------------------------------------------------------------------
+# File Info Cache
+# ------------------------------------------------------------------------------
+
+
+class FileInfoCache:
+    """
+    Persistent cache of data extracted from files (snapshot details, media durations, ...).
+    Entries are keyed by file path and are valid while the file's mtime & size don't change.
+    The cache is stored as a JSON file in the webconf cache directory.
+    """
+
+    def __init__(self, name):
+        self.fpath = f"{CACHE_DIR}/{name}.json"
+        self.lock = threading.RLock()
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.fpath) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            logging.warning(f"Can't load file info cache '{self.fpath}' => {e}")
+            self.entries = {}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                tmp_fpath = self.fpath + ".tmp"
+                with open(tmp_fpath, "w") as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp_fpath, self.fpath)
+                self.dirty = False
+            except Exception as e:
+                logging.warning(f"Can't save file info cache '{self.fpath}' => {e}")
+
+    def get(self, fpath, extract, st=None):
+        """Return the cached info for a file, calling extract(fpath) only if it's new or has changed."""
+        if st is None:
+            st = os.stat(fpath)
+        with self.lock:
+            entry = self.entries.get(fpath)
+            if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                return entry[2]
+        info = extract(fpath)
+        self.set(fpath, info, st)
+        return info
+
+    def set(self, fpath, info, st=None):
+        if st is None:
+            st = os.stat(fpath)
+        with self.lock:
+            self.entries[fpath] = [st.st_mtime_ns, st.st_size, info]
+            self.dirty = True
+
+    def update(self, fpath, extract):
+        """Refresh the info for a file that has just been written."""
+        self.set(fpath, extract(fpath))
+
+    def copy(self, src_fpath, dest_fpath, extract):
+        """Reuse the info of a file for a copy of it."""
+        self.set(dest_fpath, self.get(src_fpath, extract))
+
+    def move(self, src_path, dest_path):
+        """Re-key the entries of a renamed file or directory. Renaming keeps mtime & size."""
+        with self.lock:
+            prefix = src_path.rstrip("/") + "/"
+            for fpath in list(self.entries):
+                if fpath == src_path:
+                    self.entries[dest_path] = self.entries.pop(fpath)
+                elif fpath.startswith(prefix):
+                    self.entries[dest_path.rstrip("/") + "/" + fpath[len(prefix):]] = self.entries.pop(fpath)
+                else:
+                    continue
+                self.dirty = True
+
+    def remove(self, path):
+        """Remove the entries of a removed file or directory."""
+        with self.lock:
+            prefix = path.rstrip("/") + "/"
+            for fpath in list(self.entries):
+                if fpath == path or fpath.startswith(prefix):
+                    del self.entries[fpath]
+                    self.dirty = True
+
+    def purge(self):
+        """Remove the entries of files that don't exist anymore."""
+        with self.lock:
+            for fpath in list(self.entries):
+                if not os.path.exists(fpath):
+                    del self.entries[fpath]
+                    self.dirty = True
+
+# ------------------------------------------------------------------------------
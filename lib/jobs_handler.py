@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Background Jobs Handler
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+
+import logging
+import tornado.web
+
+from lib.background_job import background_jobs
+from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler
+
+# ------------------------------------------------------------------------------
+# Background Jobs Handler
+# ------------------------------------------------------------------------------
+
+
+class JobsHandler(tornado.web.RequestHandler):
+    """
+    JSON API for the background jobs:
+        GET /jobs => status of all the jobs
+        GET /jobs/<id> => job status
+        GET /jobs/<id>/log?offset=n => job log from byte offset
+        POST /jobs/<id>/cancel => cancel job
+    """
+
+    def get_current_user(self):
+        return self.get_secure_cookie("user")
+
+    @tornado.web.authenticated
+    def get(self, job_id=None, action=None):
+        if job_id is None:
+            self.write({'jobs': [job.get_status() for job in background_jobs.jobs.values()]})
+            return
+        job = self.get_job(job_id)
+        if action is None:
+            self.write(job.get_status())
+        elif action == "log":
+            try:
+                offset = int(self.get_argument("offset", "0"))
+            except ValueError:
+                raise tornado.web.HTTPError(400)
+            text, end = job.read_log(offset)
+            self.write({
+                'job': job.id,
+                'state': job.state,
+                'offset': offset,
+                'end': end,
+                'text': text
+            })
+        else:
+            raise tornado.web.HTTPError(404)
+
+    @tornado.web.authenticated
+    def post(self, job_id, action=None):
+        job = self.get_job(job_id)
+        if action != "cancel":
+            raise tornado.web.HTTPError(404)
+        result = {}
+        if not background_jobs.cancel(job.id):
+            result['errors'] = "Job '{}' is not running".format(job.title)
+        result['job'] = job.get_status()
+        self.write(result)
+
+    def get_job(self, job_id):
+        job = background_jobs.get(job_id)
+        if job is None:
+            raise tornado.web.HTTPError(404)
+        return job
+
+
+class JobMessageHandler(ZynthianWebSocketMessageHandler):
+    """
+    Streams the output, progress and end of background jobs. Messages:
+        "ATTACH <job id> [<offset>]": follow a job, getting its log from a byte offset
+        "DETACH <job id>": stop following a job
+        "CANCEL <job id>": cancel a job
+    """
+
+    def __init__(self, handler_name, websocket):
+        super().__init__(handler_name, websocket)
+        self.jobs = {}
+
+    def on_websocket_message(self, message):
+        parts = message.split(" ")
+        job = background_jobs.get(parts[1]) if len(parts) > 1 else None
+        if job is None:
+            logging.error("Bad job message: {}".format(message))
+            return
+        if parts[0] == "ATTACH":
+            offset = 0
+            if len(parts) > 2:
+                try:
+                    offset = max(0, int(parts[2]))
+                except ValueError:
+                    logging.error("Bad job message: {}".format(message))
+            self.jobs[job.id] = job
+            job.attach(self.send, offset)
+        elif parts[0] == "DETACH":
+            self.jobs.pop(job.id, None)
+            job.detach(self.send)
+        elif parts[0] == "CANCEL":
+            background_jobs.cancel(job.id)
+        else:
+            logging.error("Unknown job action: {}".format(parts[0]))
+
+    def on_close(self):
+        for job in self.jobs.values():
+            job.detach(self.send)
+        self.jobs = {}
+
+# ------------------------------------------------------------------------------
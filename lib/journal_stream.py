@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Journal Streams: shared asyncio-native log streaming
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+
+import asyncio
+import logging
+from collections import deque
+
+# Lines are sent in batches, at most one batch every interval (seconds)
+BATCH_INTERVAL = 0.1
+# Lines pending to be sent to a subscriber. If it falls behind, the oldest ones are dropped.
+MAX_PENDING_LINES = 1000
+# Last lines kept by every stream, sent to new subscribers
+BACKLOG_LINES = 500
+# Max length of a journal line
+MAX_LINE_LENGTH = 1024 * 1024
+# Delay before restarting journalctl if it ends (seconds), doubled while it keeps ending early
+RESTART_MIN_DELAY = 1
+RESTART_MAX_DELAY = 30
+
+# ------------------------------------------------------------------------------
+# Journal Subscriber
+# ------------------------------------------------------------------------------
+
+
+class JournalSubscriber:
+    """
+    Receives the lines of a journal stream and passes them to an async callback,
+    in batches, once every batch interval at most. The callback is awaited before
+    sending the next batch. A subscriber falling behind doesn't slow down the
+    stream: it drops its oldest pending lines and is told how many were dropped.
+    """
+
+    def __init__(self, send_batch, interval=BATCH_INTERVAL, max_pending=MAX_PENDING_LINES):
+        self.send_batch = send_batch
+        self.interval = interval
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.has_pending = asyncio.Event()
+        self.stream = None
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.send_loop())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def push(self, lines):
+        self.dropped += max(0, len(self.pending) + len(lines) - self.pending.maxlen)
+        self.pending.extend(lines)
+        if self.pending:
+            self.has_pending.set()
+
+    async def send_loop(self):
+        while True:
+            await self.has_pending.wait()
+            # Collect more lines before sending
+            await asyncio.sleep(self.interval)
+            lines = list(self.pending)
+            self.pending.clear()
+            self.has_pending.clear()
+            if self.dropped:
+                lines.insert(0, f"... {self.dropped} lines dropped ...")
+                self.dropped = 0
+            await self.send_batch(lines)
+
+# ------------------------------------------------------------------------------
+# Journal Stream
+# ------------------------------------------------------------------------------
+
+
+class JournalStream:
+    """
+    Follows the journal of a systemd unit ("journalctl -f") from the IOLoop,
+    without threads nor polling, and multicasts every line to the subscribers.
+    The last lines are kept in a ring buffer, so new subscribers get the backlog
+    without re-running journalctl. If journalctl ends, it's restarted after a
+    growing delay.
+    """
+
+    def __init__(self, unit, backlog=BACKLOG_LINES):
+        self.unit = unit
+        self.backlog = deque(maxlen=backlog)
+        self.subscribers = set()
+        self.process = None
+        self.task = None
+
+    def start(self):
+        logging.info(f"journalctl -f -u {self.unit}")
+        self.task = asyncio.ensure_future(self.read_loop())
+
+    def stop(self):
+        logging.info(f"Stop following journal of '{self.unit}'")
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.process and self.process.returncode is None:
+            try:
+                self.process.terminate()
+            except ProcessLookupError:
+                pass
+        self.process = None
+
+    def add_subscriber(self, subscriber):
+        self.subscribers.add(subscriber)
+        subscriber.stream = self
+        subscriber.push(list(self.backlog))
+        subscriber.start()
+
+    def remove_subscriber(self, subscriber):
+        subscriber.stop()
+        subscriber.stream = None
+        self.subscribers.discard(subscriber)
+
+    def publish(self, line):
+        for subscriber in self.subscribers:
+            subscriber.push((line,))
+
+    async def read_loop(self):
+        # The initial backlog fills the ring buffer. After a restart, only new lines are read.
+        nlines = self.backlog.maxlen
+        delay = RESTART_MIN_DELAY
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                self.process = await asyncio.create_subprocess_exec("journalctl", "-f", "-n", str(nlines), "-u", self.unit,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, limit=MAX_LINE_LENGTH)
+                while True:
+                    line = await self.process.stdout.readline()
+                    if not line:
+                        break
+                    line = line.decode("utf-8", errors="replace").rstrip("\n")
+                    self.backlog.append(line)
+                    self.publish(line)
+                await self.process.wait()
+                error = f"journalctl ended with code {self.process.returncode}"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = f"Can't run journalctl => {e}"
+
+            # Keep the stream alive: tell the subscribers and restart journalctl after a while
+            if loop.time() - started > RESTART_MAX_DELAY:
+                delay = RESTART_MIN_DELAY
+            logging.error(f"Following journal of '{self.unit}': {error}. Restarting in {delay}s")
+            self.publish(f"... {error}. Restarting in {delay} seconds ...")
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, RESTART_MAX_DELAY)
+            nlines = 0
+
+# ------------------------------------------------------------------------------
+# Journal Stream Registry
+# ------------------------------------------------------------------------------
+
+
+class JournalStreamRegistry:
+    """
+    A single reference-counted journal stream per unit, shared by all the subscribers.
+    The stream is started by the first subscriber and stopped after the last one leaves.
+    """
+
+    def __init__(self):
+        self.streams = {}
+
+    def subscribe(self, unit, subscriber):
+        if subscriber.stream:
+            if subscriber.stream.unit == unit:
+                return
+            self.unsubscribe(subscriber)
+        stream = self.streams.get(unit)
+        if stream is None:
+            stream = self.streams[unit] = JournalStream(unit)
+            stream.start()
+        stream.add_subscriber(subscriber)
+
+    def unsubscribe(self, subscriber):
+        stream = subscriber.stream
+        if stream is None:
+            return
+        stream.remove_subscriber(subscriber)
+        if not stream.subscribers:
+            stream.stop()
+            del self.streams[stream.unit]
+
+    def get_stats(self):
+        return {unit: len(stream.subscribers) for unit, stream in self.streams.items()}
+
+
+journal_streams = JournalStreamRegistry()
+
+# ------------------------------------------------------------------------------
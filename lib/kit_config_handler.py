@@ -173,6 +173,10 @@ class KitConfigHandler(ZynthianConfigHandler):
 
         errors = self.update_config(pconfig)
         DisplayConfigHandler.delete_fb_splash()
-        WiringConfigHandler.rebuild_zyncoder()
+        job = WiringConfigHandler.rebuild_zyncoder()
+        if job:
+            self.follow_job(job)
+        else:
+            errors = errors or WiringConfigHandler.REBUILD_RUNNING_ERROR
 
         return errors
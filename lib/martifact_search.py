@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Musical Artifacts Search Client
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+
+import os
+import json
+import time
+import asyncio
+import logging
+import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.file_info_cache import CACHE_DIR
+
+MARTIFACT_SEARCH_URL = os.environ.get('ZYNTHIAN_WEBCONF_MARTIFACT_URL', "https://musical-artifacts.com/artifacts.json")
+MARTIFACT_SEARCH_TTL = 3600
+MARTIFACT_SEARCH_TIMEOUT = 20
+MARTIFACT_SEARCH_WORKERS = 4
+MARTIFACT_CACHE_SIZE = 100
+
+# ------------------------------------------------------------------------------
+# Musical Artifacts Search Client
+# ------------------------------------------------------------------------------
+
+
+class MusicalArtifactsSearch:
+    """
+    Searches musical-artifacts.com, querying every format concurrently over a pooled session.
+    Results are cached by (formats, tags) for a while. The cache is stored in the webconf cache
+    directory and expired entries are still used when the site can't be reached.
+    """
+
+    def __init__(self, url=MARTIFACT_SEARCH_URL, name="martifact_search"):
+        self.url = url
+        self.fpath = f"{CACHE_DIR}/{name}.json"
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=MARTIFACT_SEARCH_WORKERS, thread_name_prefix="martifact")
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=MARTIFACT_SEARCH_WORKERS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.fpath) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            logging.warning(f"Can't load search cache '{self.fpath}' => {e}")
+            self.entries = {}
+
+    def save(self):
+        with self.lock:
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                tmp_fpath = self.fpath + ".tmp"
+                with open(tmp_fpath, "w") as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp_fpath, self.fpath)
+            except Exception as e:
+                logging.warning(f"Can't save search cache '{self.fpath}' => {e}")
+
+    @staticmethod
+    def get_key(formats, tags):
+        return ",".join(formats) + "|" + tags
+
+    def get_cached(self, key, max_age=MARTIFACT_SEARCH_TTL):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and (max_age is None or time.time() - entry[0] < max_age):
+            return entry[1]
+
+    def set_cached(self, key, results):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = [time.time(), results]
+            # Drop the oldest searches
+            while len(self.entries) > MARTIFACT_CACHE_SIZE:
+                del self.entries[next(iter(self.entries))]
+
+    def query(self, fmt, tags):
+        """Query a single format. Blocking!"""
+        params = {}
+        if fmt:
+            params['formats'] = fmt
+        if tags:
+            params['tags'] = tags
+        res = self.session.get(self.url, params=params, verify=False, timeout=MARTIFACT_SEARCH_TIMEOUT)
+        res.raise_for_status()
+        return res.json()
+
+    @staticmethod
+    def merge(results_list):
+        """Merge the results of every format, removing duplicated artifacts"""
+        result = []
+        ids = set()
+        for results in results_list:
+            for row in results:
+                xid = row.get('id')
+                if xid is not None:
+                    if xid in ids:
+                        continue
+                    ids.add(xid)
+                if "file" not in row:
+                    if "mirrors" in row and len(row['mirrors']) > 0:
+                        row['file'] = row['mirrors'][0]
+                    else:
+                        row['file'] = None
+                result.append(row)
+        return result
+
+    async def search(self, formats, tags):
+        formats = [fmt.strip() for fmt in formats.split(',') if fmt.strip()] or [""]
+        tags = tags.strip()
+        key = self.get_key(formats, tags)
+        result = self.get_cached(key)
+        if result is not None:
+            return result
+
+        loop = asyncio.get_running_loop()
+        responses = await asyncio.gather(*[loop.run_in_executor(self.executor, self.query, fmt, tags)
+                                           for fmt in formats], return_exceptions=True)
+        errors = [res for res in responses if isinstance(res, Exception)]
+        if errors:
+            # Offline or failing => use the expired results, if any
+            result = self.get_cached(key, None)
+            if result is not None:
+                logging.warning(f"Can't search Musical Artifacts, using cached results => {errors[0]}")
+                return result
+            raise errors[0]
+
+        result = self.merge(responses)
+        self.set_cached(key, result)
+        await loop.run_in_executor(self.executor, self.save)
+        return result
+
+
+martifact_search = MusicalArtifactsSearch()
+
+# ------------------------------------------------------------------------------
@@ -23,13 +23,73 @@
 # ********************************************************************
 
 import mido
+import time
 import logging
-import jsonpickle
+import threading
 import tornado.web
+from tornado.ioloop import PeriodicCallback
 from lib.zynthian_config_handler import ZynthianBasicHandler
-from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler, ZynthianWebSocketMessage
+from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler
 from lib.midi_config_handler import get_ports_config
 
+# Capacity of the MIDI event ring buffer. Older events are dropped when it's full.
+MIDI_RING_SIZE = 4096
+# Period of the event batches sent to the client (ms)
+MIDI_FLUSH_INTERVAL = 50
+# Realtime messages that can be filtered out at source
+MIDI_FILTER_STATUS = {
+    'clock': 0xF8,
+    'active_sensing': 0xFE
+}
+MIDI_DEFAULT_FILTER = ('clock', 'active_sensing')
+
+# ------------------------------------------------------------------------------
+# MIDI Event Ring Buffer
+# ------------------------------------------------------------------------------
+
+
+class MidiEventRing:
+    """
+    Preallocated ring buffer of raw MIDI events (timestamp + bytes), filled from the
+    MIDI input thread and drained from the IOLoop. When it's full, the oldest events
+    are overwritten and counted as dropped.
+    """
+
+    def __init__(self, size=MIDI_RING_SIZE):
+        self.size = size
+        self.times = [0.0] * size
+        self.events = [None] * size
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.widx = 0
+            self.ridx = 0
+            self.dropped = 0
+
+    def push(self, t, data):
+        with self.lock:
+            if self.widx - self.ridx >= self.size:
+                self.ridx += 1
+                self.dropped += 1
+            i = self.widx % self.size
+            self.times[i] = t
+            self.events[i] = data
+            self.widx += 1
+
+    def pop_all(self):
+        """Return the pending events as a list of [time, byte0, byte1, ...] and the dropped counter, resetting both."""
+        with self.lock:
+            res = []
+            for j in range(self.ridx, self.widx):
+                i = j % self.size
+                res.append([self.times[i]] + self.events[i])
+            self.ridx = self.widx
+            dropped = self.dropped
+            self.dropped = 0
+        return res, dropped
+
 # ------------------------------------------------------------------------------
 # UI Configuration
 # ------------------------------------------------------------------------------
@@ -100,16 +160,19 @@ class MidiLogHandler(ZynthianBasicHandler):
 class MidiLogMessageHandler(ZynthianWebSocketMessageHandler):
     mido_port = None
     midi_port_name = None
-
-    @classmethod
-    def is_registered_for(cls, handler_name):
-        return handler_name == 'MidiLogMessageHandler'
+    ring = MidiEventRing()
+    flusher = None
+    write_future = None
+    filter_status = frozenset(MIDI_FILTER_STATUS[t] for t in MIDI_DEFAULT_FILTER)
+    t0 = 0
 
     def do_start_logging(self, midi_port_name):
         logging.info("start midi logging on {}".format(midi_port_name))
 
         self.do_stop_logging()
         MidiLogMessageHandler.midi_port_name = midi_port_name
+        MidiLogMessageHandler.ring.clear()
+        MidiLogMessageHandler.t0 = time.monotonic()
 
         try:
             mido.set_backend('mido.backends.rtmidi/UNIX_JACK')
@@ -118,17 +181,44 @@ class MidiLogMessageHandler(ZynthianWebSocketMessageHandler):
         except Exception as err:
             logging.error("Can't open MIDI Port {}: {}".format(
                 self.midi_port_name, err))
+            return
+
+        # Events are sent in batches, from the IOLoop
+        MidiLogMessageHandler.flusher = PeriodicCallback(self.flush_events, MIDI_FLUSH_INTERVAL)
+        MidiLogMessageHandler.flusher.start()
 
     def on_midi_in(self, msg):
-        message = ZynthianWebSocketMessage('MidiLogMessageHandler', msg)
-        # Hack to avoid JSON parse error in javascript handler
-        json = jsonpickle.encode(message).replace("Infinity", "0")
-        self.ioloop.call_soon_threadsafe(self.websocket.write_message, json)
+        # Called from the MIDI input thread => only store the raw event
+        data = msg.bytes()
+        if data[0] not in self.filter_status:
+            self.ring.push(round((time.monotonic() - self.t0) * 1000, 1), data)
+
+    def flush_events(self):
+        # Don't queue more data while the previous batch is being sent
+        if self.write_future and not self.write_future.done():
+            return
+        events, dropped = self.ring.pop_all()
+        if not events and not dropped:
+            return
+        MidiLogMessageHandler.write_future = self.send({
+            'events': events,
+            'dropped': dropped
+        })
 
     def do_stop_logging(self):
+        if MidiLogMessageHandler.flusher:
+            MidiLogMessageHandler.flusher.stop()
+            MidiLogMessageHandler.flusher = None
+        MidiLogMessageHandler.write_future = None
         if MidiLogMessageHandler.mido_port:
             logging.info("stop midi logging")
             MidiLogMessageHandler.mido_port.close()
+            MidiLogMessageHandler.mido_port = None
+
+    @staticmethod
+    def set_filter(types):
+        """Set the realtime message types (clock, active_sensing) to be filtered out at source"""
+        MidiLogMessageHandler.filter_status = frozenset(MIDI_FILTER_STATUS[t] for t in types if t in MIDI_FILTER_STATUS)
 
     def on_websocket_message(self, message):
         logging.debug("message: %s " % message)
@@ -145,6 +235,12 @@ class MidiLogMessageHandler(ZynthianWebSocketMessageHandler):
         elif action == 'STOP_LOGGING':
             self.do_stop_logging()
 
+        elif action == 'SET_FILTER':
+            try:
+                self.set_filter(parts[1].split(","))
+            except IndexError:
+                self.set_filter([])
+
         elif action == 'GET_MIDI_PORT':
             self.websocket.write_message(
                 "MIDI_PORT = {}".format(self.midi_port_name))
@@ -153,8 +249,8 @@ class MidiLogMessageHandler(ZynthianWebSocketMessageHandler):
         logging.debug("message handled.")
 
     def on_open(self):
-        self.set_nodelay(True)
+        self.websocket.set_nodelay(True)
 
     def on_close(self):
-        logging.info("stopping tail threads")
+        logging.info("stopping midi logging")
         self.do_stop_logging()
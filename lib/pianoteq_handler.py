@@ -33,6 +33,7 @@ from subprocess import check_output, STDOUT
 
 import zynconf
 from zyngine.zynthian_engine_pianoteq import *
+from lib.background_job import background_jobs
 from lib.zynthian_config_handler import ZynthianBasicHandler
 
 # sys.path.append(os.environ.get('ZYNTHIAN_UI_DIR'))
@@ -92,9 +93,9 @@ class PianoteqHandler(ZynthianBasicHandler):
 
             # Install different type of files
             filename_parts = os.path.splitext(filename)
-            # Pianoteq binaries
+            # Pianoteq binaries => installed & configured by a background job
             if filename_parts[1].lower() in ('.7z', '.xz'):
-                errors = self.do_install_pianoteq_binary(filename)
+                return self.do_install_pianoteq_binary(filename)
             # Pianoteq instruments
             elif filename_parts[1].lower() == '.ptq':
                 errors = self.do_install_pianoteq_ptq(filename)
@@ -108,16 +109,26 @@ class PianoteqHandler(ZynthianBasicHandler):
         return errors
 
     def do_install_pianoteq_binary(self, filename):
+        # A running install would be returned, and this upload neither installed nor removed
+        if background_jobs.is_running("pianoteq_install"):
+            logging.error("Can't install '{}': Pianoteq is already being installed".format(filename))
+            try:
+                os.remove(filename)
+            except Exception as e:
+                logging.error("Can't remove '{}' => {}".format(filename, e))
+            return "Pianoteq is already being installed. Try again when finished."
+        self.start_job("pianoteq_install", self.install_pianoteq_binary, filename, title="Installing Pianoteq")
+
+    def install_pianoteq_binary(self, job, filename):
         # Install new binary package
-        command = self.recipes_dir + "/install_pianoteq_binary.sh {}; exit 0".format(filename)
-        result = check_output(command, shell=True, stderr=STDOUT).decode("utf-8")
-        rows = result.splitlines()
-        if rows[-1] == "Pianoteq Installed Successfully!":
-            logging.info(rows[-1])
-            return None
-        else:
-            logging.error(result)
-            return rows[-1]
+        command = self.recipes_dir + "/install_pianoteq_binary.sh {}".format(filename)
+        job.run_command(command)
+        if job.last_line != "Pianoteq Installed Successfully!":
+            logging.error("Installing Pianoteq failed: {}".format(job.last_line))
+            return job.last_line
+        logging.info(job.last_line)
+        # Configure Pianoteq
+        self.pianoteq_autoconfig()
 
     def do_install_pianoteq_ptq(self, filename):
         try:
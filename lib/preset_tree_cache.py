@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Preset Tree Cache
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+
+import os
+import time
+
+# Banks without a filesystem path, whose changes can't be detected, are reloaded after this time (seconds)
+PRESET_TREE_TTL = 300
+
+# ------------------------------------------------------------------------------
+# Preset Tree Cache
+# ------------------------------------------------------------------------------
+
+
+def get_path_mtime(fpath):
+    """Return the mtime (ns) of a bank path, or None if it's not an existing filesystem path."""
+    if isinstance(fpath, str) and fpath.startswith("/"):
+        try:
+            return os.stat(fpath).st_mtime_ns
+        except OSError:
+            pass
+    return None
+
+
+class PresetTreeCache:
+    """
+    Cache of the bank list and the bank presets returned by the engines' zynapi, by engine code.
+    Every cached list has a signature with the mtime of the paths it depends on: the parent
+    dirs of the banks for the bank list, and the bank path for its presets. A list is reloaded
+    when any of them has changed. Lists without paths to check are reloaded after PRESET_TREE_TTL.
+    Mutations invalidate only the affected bank, so the rest of the tree is not reloaded.
+    """
+
+    def __init__(self):
+        self.engines = {}
+
+    def get_entry(self, eng_code):
+        try:
+            return self.engines[eng_code]
+        except KeyError:
+            entry = {
+                'banks': None,
+                'presets': {}
+            }
+            self.engines[eng_code] = entry
+            return entry
+
+    def get_banks(self, eng_code, engine_cls):
+        entry = self.get_entry(eng_code)
+        if entry['banks'] is None or not self.is_valid(*entry['banks'][:2]):
+            banks = engine_cls.zynapi_get_banks()
+            sig = {}
+            for b in banks:
+                if b['fullpath'] is None:
+                    continue
+                dpath = os.path.dirname(b['fullpath']) if isinstance(b['fullpath'], str) else None
+                mtime = get_path_mtime(dpath)
+                if mtime is None:
+                    sig = None
+                    break
+                sig[dpath] = mtime
+            entry['banks'] = (sig, time.monotonic(), banks)
+        return entry['banks'][2]
+
+    def get_presets(self, eng_code, engine_cls, bank):
+        entry = self.get_entry(eng_code)
+        cached = entry['presets'].get(bank['fullpath'])
+        if cached is None or not self.is_valid(*cached[:2]):
+            mtime = get_path_mtime(bank['fullpath'])
+            sig = {bank['fullpath']: mtime} if mtime is not None else None
+            cached = (sig, time.monotonic(), engine_cls.zynapi_get_presets(bank))
+            entry['presets'][bank['fullpath']] = cached
+        return cached[2]
+
+    def get_cached_presets(self, eng_code, bank):
+        """Return the presets of a bank if they are cached and valid, else None. Never calls the zynapi."""
+        cached = self.get_entry(eng_code)['presets'].get(bank['fullpath'])
+        if cached is None or not self.is_valid(*cached[:2]):
+            return None
+        return cached[2]
+
+    @staticmethod
+    def is_valid(sig, ts):
+        if not sig:
+            return time.monotonic() - ts < PRESET_TREE_TTL
+        for fpath, mtime in sig.items():
+            if get_path_mtime(fpath) != mtime:
+                return False
+        return True
+
+    def invalidate_banks(self, eng_code):
+        """Reload the bank list on next access. Bank presets are kept."""
+        self.get_entry(eng_code)['banks'] = None
+
+    def invalidate_bank(self, eng_code, bank_fullpath):
+        """Reload the presets of a bank on next access."""
+        self.get_entry(eng_code)['presets'].pop(bank_fullpath, None)
+
+    def invalidate(self, eng_code=None):
+        if eng_code is None:
+            self.engines = {}
+        else:
+            self.engines.pop(eng_code, None)
+
+
+preset_tree_cache = PresetTreeCache()
+
+# ------------------------------------------------------------------------------
@@ -24,20 +24,29 @@
 
 import os
 import copy
-import glob
 import shutil
 import logging
-import zipfile
-import tarfile
 import requests
+import tempfile
+import threading
+import contextlib
 import tornado.web
+import tornado.ioloop
 
 from zyngui.zynthian_gui_engine import *
 from zyngine.zynthian_chain_manager import zynthian_chain_manager
 
 from lib.upload_handler import TMP_DIR
+from lib.martifact_search import martifact_search
+from lib.archive_extract import CHUNK_SIZE, split_archive_ext, extract_archive
+from lib.file_download import send_file, send_zip, iter_dir_entries
+from lib.preset_tree_cache import preset_tree_cache
 from lib.zynthian_config_handler import ZynthianBasicHandler
 
+# Engine API calls are serialized: the jalv zynapi instance is shared at class level.
+# Install jobs hold it while installing. Downloads & extraction run in parallel.
+zynapi_lock = threading.Lock()
+
 # ------------------------------------------------------------------------------
 # Soundfont Configuration
 # ------------------------------------------------------------------------------
@@ -57,30 +66,33 @@ class PresetsConfigHandler(ZynthianBasicHandler):
         super().get("presets.html", "Presets & Soundfonts", config, None)
 
     @tornado.web.authenticated
-    def post(self, action):
+    async def post(self, action):
         try:
             self.eng_code = self.get_argument('ENGINE', 'ZY')
             self.eng_info = self.get_engine_info()[self.eng_code]
             self.engine_cls = self.eng_info['ENGINE']
-            if self.engine_cls == zynthian_engine_jalv:
-                self.engine_cls.init_zynapi_instance(self.eng_code)
         except Exception as e:
             logging.error("Can't initialize engine '{}': {}\n{}".format(
                 self.eng_code, e, self.eng_info))
 
         try:
-            result = {
-                'get_tree': lambda: self.do_get_tree(),
-                'new_bank': lambda: self.do_new_bank(),
-                'remove_bank': lambda: self.do_remove_bank(),
-                'rename_bank': lambda: self.do_rename_bank(),
-                'remove_preset': lambda: self.do_remove_preset(),
-                'rename_preset': lambda: self.do_rename_preset(),
-                'download': lambda: self.do_download(),
-                'search': lambda: self.do_search(),
-                'install': lambda: self.do_install_url(),
-                'upload': lambda: self.do_install_file()
-            }[action]()
+            if action == 'download':
+                result = await self.do_download()
+            elif action == 'search':
+                result = await self.do_search()
+            else:
+                async with self.zynapi_locked():
+                    result = {
+                        'get_tree': lambda: self.do_get_tree(),
+                        'get_bank_presets': lambda: self.do_get_bank_presets(),
+                        'new_bank': lambda: self.do_new_bank(),
+                        'remove_bank': lambda: self.do_remove_bank(),
+                        'rename_bank': lambda: self.do_rename_bank(),
+                        'remove_preset': lambda: self.do_remove_preset(),
+                        'rename_preset': lambda: self.do_rename_preset(),
+                        'install': lambda: self.do_install_url(),
+                        'upload': lambda: self.do_install_file()
+                    }[action]()
 
         except:
             result = {}
@@ -88,6 +100,20 @@ class PresetsConfigHandler(ZynthianBasicHandler):
         if result:
             self.write(result)
 
+    @contextlib.asynccontextmanager
+    async def zynapi_locked(self):
+        """Hold the zynapi lock, waiting for it out of the IOLoop, and init the engine API"""
+        await tornado.ioloop.IOLoop.current().run_in_executor(None, zynapi_lock.acquire)
+        try:
+            if self.engine_cls == zynthian_engine_jalv:
+                try:
+                    self.engine_cls.init_zynapi_instance(self.eng_code)
+                except Exception as e:
+                    logging.error("Can't initialize engine '{}': {}".format(self.eng_code, e))
+            yield
+        finally:
+            zynapi_lock.release()
+
     def do_get_tree(self):
         result = {}
         try:
@@ -102,6 +128,22 @@ class PresetsConfigHandler(ZynthianBasicHandler):
             result['errors'] = "Can't get preset tree data: {}".format(e)
         return result
 
+    def do_get_bank_presets(self):
+        result = {}
+        bank_fullpath = self.get_argument('BANK_FULLPATH')
+        try:
+            for b in preset_tree_cache.get_banks(self.eng_code, self.engine_cls):
+                if b['fullpath'] == bank_fullpath:
+                    result['bank_presets'] = self.get_bank_presets_data(b)
+                    break
+            else:
+                raise ValueError("Bank '{}' not found".format(bank_fullpath))
+        except Exception as e:
+            logging.error(e)
+            result['errors'] = "Can't get bank presets: {}".format(e)
+        result['bank_fullpath'] = bank_fullpath
+        return result
+
     def do_new_bank(self):
         result = {}
         try:
@@ -109,6 +151,7 @@ class PresetsConfigHandler(ZynthianBasicHandler):
         except Exception as e:
             logging.error(e)
             result['errors'] = "Can't create new bank: {}".format(e)
+        preset_tree_cache.invalidate_banks(self.eng_code)
         result.update(self.do_get_tree())
         return result
 
@@ -120,6 +163,7 @@ class PresetsConfigHandler(ZynthianBasicHandler):
         except Exception as e:
             logging.error(e)
             result['errors'] = "Can't rename bank: {}".format(e)
+        self.invalidate_bank(self.get_argument('SEL_FULLPATH'), banks=True)
         result.update(self.do_get_tree())
         return result
 
@@ -131,6 +175,7 @@ class PresetsConfigHandler(ZynthianBasicHandler):
         except Exception as e:
             logging.error(e)
             result['errors'] = "Can't remove bank: {}".format(e)
+        self.invalidate_bank(self.get_argument('SEL_FULLPATH'), banks=True)
         result.update(self.do_get_tree())
         return result
 
@@ -142,6 +187,7 @@ class PresetsConfigHandler(ZynthianBasicHandler):
         except Exception as e:
             logging.error(e)
             result['errors'] = "Can't rename preset: {}".format(e)
+        self.invalidate_bank(self.get_argument('SEL_BANK_FULLPATH', None))
         result.update(self.do_get_tree())
         return result
 
@@ -153,152 +199,94 @@ class PresetsConfigHandler(ZynthianBasicHandler):
         except Exception as e:
             logging.error(e)
             result['errors'] = "Can't remove preset: {}".format(e)
+        self.invalidate_bank(self.get_argument('SEL_BANK_FULLPATH', None))
         result.update(self.do_get_tree())
         return result
 
-    def do_download(self):
+    async def do_download(self):
         result = None
-        fpath = None
-        delete = False
         try:
-            fpath = self.engine_cls.zynapi_download(
-                self.get_argument('SEL_FULLPATH'))
+            async with self.zynapi_locked():
+                fpath = self.engine_cls.zynapi_download(
+                    self.get_argument('SEL_FULLPATH'))
             dname, fname = os.path.split(fpath)
             if os.path.isdir(fpath):
-                zfpath = TMP_DIR + "/" + fname
-                shutil.make_archive(zfpath, 'zip', fpath)
-                fpath = zfpath + ".zip"
-                fname += ".zip"
-                delete = True
-                mime_type = "application/zip"
+                # Zip the directory on the fly, straight into the response
+                await send_zip(self, fname + ".zip", iter_dir_entries(fpath))
             else:
-                delete = False
-                mime_type = "application/octet-stream"
-
-            self.set_header('Content-Type', mime_type)
-            self.set_header("Content-Description", "File Transfer")
-            self.set_header('Content-Disposition',
-                            'attachment; filename="{}"'.format(fname))
-            with open(fpath, 'rb') as f:
-                while True:
-                    data = f.read(4096)
-                    if not data:
-                        break
-                    self.write(data)
-                self.finish()
+                await send_file(self, fpath, fname)
         except Exception as e:
             logging.error(e)
             result = {
                 "errors": "Can't download file: {}".format(e)
             }
-        finally:
-            if fpath and delete:
-                os.remove(fpath)
         return result
 
-    def do_search(self):
+    async def do_search(self):
         result = {}
         try:
-            maformats = self.engine_cls.zynapi_martifact_formats()
-            result['search_results'] = self.search_artifacts(
+            async with self.zynapi_locked():
+                maformats = self.engine_cls.zynapi_martifact_formats()
+            result['search_results'] = await martifact_search.search(
                 maformats, self.get_argument('MUSICAL_ARTIFACT_TAGS'))
-        except OSError as e:
+        except Exception as e:
             logging.error(e)
             result['errors'] = "Can't search Musical Artifacts: {}".format(e)
         return result
 
+    # Installs run as background jobs, one per file, in parallel. The result has their status.
+
     def do_install_file(self):
-        result = {}
+        result = {'jobs': []}
         try:
+            bank_fullpath = self.get_argument('SEL_BANK_FULLPATH')
             for fpath in self.get_argument('INSTALL_FPATH').split(","):
                 fpath = fpath.strip()
                 if len(fpath) > 0:
-                    self.install_file(fpath)
+                    job = self.start_job("preset_install_" + fpath, self.install_file,
+                        self.engine_cls, self.eng_code, fpath, bank_fullpath,
+                        title="Installing {}".format(os.path.basename(fpath)))
+                    result['jobs'].append(job.get_status())
         except Exception as e:
             logging.error(e)
             result['errors'] = "Can't install file: {}".format(e)
-        result.update(self.do_get_tree())
         return result
 
     def do_install_url(self):
-        result = {}
+        result = {'jobs': []}
         try:
-            self.install_url(self.get_argument('INSTALL_URL'))
+            url = self.get_argument('INSTALL_URL')
+            job = self.start_job("preset_install_" + url, self.install_url,
+                self.engine_cls, self.eng_code, url, self.get_argument('SEL_BANK_FULLPATH'),
+                title="Installing {}".format(os.path.basename(url)))
+            result['jobs'].append(job.get_status())
         except Exception as e:
             logging.error(e)
             result['errors'] = "Can't install URL: {}".format(e)
-        result.update(self.do_get_tree())
         return result
 
-    def search_artifacts(self, formats, tags):
-        result = []
-        for fmt in formats.split(','):
-            query_url = "https://musical-artifacts.com/artifacts.json"
-            sep = '?'
-            if formats:
-                query_url += sep + 'formats=' + fmt
-                sep = "&"
-            if tags:
-                query_url += sep + 'tags=' + tags
-                # query_url += sep + 'q=' + tags
-
-            result += requests.get(query_url, verify=False).json()
-
-        for row in result:
-            if "file" not in row:
-                if "mirrors" in row and len(row['mirrors']) > 0:
-                    row['file'] = row['mirrors'][0]
-                else:
-                    row['file'] = None
-
-        return result
-
-    def install_file(self, fpath):
-        logging.info("Unpacking '{}' ...".format(fpath))
-        dpath = fpath
+    @staticmethod
+    def install_file(job, engine_cls, eng_code, fpath, bank_fullpath):
+        dpath, ext = split_archive_ext(fpath)
+        xdir = None
         try:
-            if fpath.endswith('.tar.bz2'):
-                dpath = fpath[:-8]
-                tar = tarfile.open(fpath, "r:bz2")
-                tar.extractall(dpath)
-            elif fpath.endswith('.tar.gz'):
-                dpath = fpath[:-7]
-                tar = tarfile.open(fpath, "r:gz")
-                tar.extractall(dpath)
-            elif fpath.endswith('.tar.xz'):
-                dpath = fpath[:-7]
-                tar = tarfile.open(fpath, "r:xz")
-                tar.extractall(dpath)
-            elif fpath.endswith('.tgz'):
-                dpath = fpath[:-4]
-                tar = tarfile.open(fpath, "r:gz")
-                tar.extractall(dpath)
-            elif fpath.endswith('.zip'):
-                dpath = fpath[:-4]
-                with zipfile.ZipFile(fpath, 'r') as soundfontZip:
-                    soundfontZip.extractall(dpath)
-
-            if os.path.isdir(dpath):
-                # Unroll nested dir
-                head, tail = os.path.split(dpath)
-                ddpath = f"{dpath}/{tail}"
-                if os.path.isdir(ddpath):
-                    # Rename subdir to avoid existing filename issues when moving up
-                    tmp_subdir = dpath + "/zyn_tmp_subdir"
-                    os.rename(ddpath, tmp_subdir)
-                    # Move up nested dir content
-                    for f in glob.glob(tmp_subdir + "/*"):
-                        shutil.move(f, dpath)
-                    # Remove empty nested dir
-                    shutil.rmtree(tmp_subdir, ignore_errors=True)
-                # Remove thrash ...
-                shutil.rmtree(dpath + "/__MACOSX", ignore_errors=True)
-
-            bank_fullpath = self.get_argument('SEL_BANK_FULLPATH')
-            logging.info("Installing '{}' => '{}' ...".format(
-                dpath, bank_fullpath))
-
-            self.engine_cls.zynapi_install(dpath, bank_fullpath)
+            if ext:
+                # Unpack into a dir named as the archive, unrolling the nested dir with the same name.
+                # It's created inside a unique temporal dir, as jobs run in parallel.
+                xdir = tempfile.mkdtemp(dir=TMP_DIR)
+                dpath = os.path.join(xdir, os.path.basename(dpath))
+                job.log("Unpacking '{}' ...".format(os.path.basename(fpath)))
+                count = extract_archive(fpath, dpath, strip_dir=os.path.basename(dpath),
+                    progress=job.report_progress, is_cancelled=job.is_cancelled)
+                job.log("Unpacked {} files".format(count))
+            if job.is_cancelled():
+                return
+
+            job.log("Installing '{}' => '{}' ...".format(os.path.basename(dpath), bank_fullpath))
+            with zynapi_lock:
+                if engine_cls == zynthian_engine_jalv:
+                    engine_cls.init_zynapi_instance(eng_code)
+                engine_cls.zynapi_install(dpath, bank_fullpath)
 
         # Always clean temporal files & dirs
         finally:
@@ -306,18 +294,39 @@ class PresetsConfigHandler(ZynthianBasicHandler):
                 os.remove(fpath)
             except:
                 pass
-            shutil.rmtree(dpath, ignore_errors=True)
-            pass
-
-    def install_url(self, url):
-        logging.info("Downloading '{}' ...".format(url))
-        res = requests.get(url, verify=False)
+            if xdir:
+                shutil.rmtree(xdir, ignore_errors=True)
+            preset_tree_cache.invalidate_bank(eng_code, bank_fullpath)
+            preset_tree_cache.invalidate_banks(eng_code)
+
+    @classmethod
+    def install_url(cls, job, engine_cls, eng_code, url, bank_fullpath):
+        job.log("Downloading '{}' ...".format(url))
         head, tail = os.path.split(url)
-        fpath = TMP_DIR + "/" + tail
-        with open(fpath, "wb") as df:
-            df.write(res.content)
-            df.close()
-            self.install_file(fpath)
+        # Jobs run in parallel => download into a unique temporal dir, keeping the file name
+        ddir = tempfile.mkdtemp(dir=TMP_DIR)
+        try:
+            return cls.download_install(job, engine_cls, eng_code, url, os.path.join(ddir, tail), bank_fullpath)
+        finally:
+            shutil.rmtree(ddir, ignore_errors=True)
+
+    @classmethod
+    def download_install(cls, job, engine_cls, eng_code, url, fpath, bank_fullpath):
+        # Stream to disk, chunk by chunk. Partial downloads are removed with the temporal dir.
+        with requests.get(url, verify=False, stream=True) as res:
+            res.raise_for_status()
+            total = int(res.headers.get('Content-Length', 0))
+            received = 0
+            with open(fpath, "wb") as df:
+                for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
+                    if job.is_cancelled():
+                        return
+                    df.write(chunk)
+                    received += len(chunk)
+                    if total:
+                        job.report_progress(100 * received // total)
+        job.report_progress(None)
+        return cls.install_file(job, engine_cls, eng_code, fpath, bank_fullpath)
 
     def get_engine_info(self):
         engine_info = copy.copy(zynthian_chain_manager.get_engine_info())
@@ -332,20 +341,26 @@ class PresetsConfigHandler(ZynthianBasicHandler):
         except:
             return ""
 
+    def invalidate_bank(self, bank_fullpath, banks=False):
+        """Patch the cached preset tree after a mutation: reload the affected bank (and the bank list)."""
+        if bank_fullpath:
+            preset_tree_cache.invalidate_bank(self.eng_code, bank_fullpath)
+        if banks:
+            preset_tree_cache.invalidate_banks(self.eng_code)
+
     def get_presets_data(self):
-        i = 0
+        """Return the superbank & bank nodes. Bank presets are loaded on demand, with get_bank_presets."""
         superbanks_data = []
         superbank_row = None
         banks_data = []
         try:
-            for b in self.engine_cls.zynapi_get_banks():
+            for b in preset_tree_cache.get_banks(self.eng_code, self.engine_cls):
                 if b['fullpath'] is None:
                     if banks_data and superbank_row:
                         superbank_row['nodes'] = banks_data
                         superbanks_data.append(superbank_row)
                         banks_data = []
                     superbank_row = {
-                        'id': i,
                         'text': b['text'],
                         'name': b['name'],
                         'fullpath': None,
@@ -356,37 +371,19 @@ class PresetsConfigHandler(ZynthianBasicHandler):
                     continue
 
                 brow = {
-                    'id': i,
                     'text': b['text'],
                     'name': b['name'],
                     'fullpath': b['fullpath'],
                     'readonly': b['readonly'],
                     'node_type': "BANK",
                     'nodes': [],
+                    'loaded': False,
                     'icon': "glyphicon glyphicon-link" if b['readonly'] else None
                 }
-                i += 1
-                try:
-                    presets_data = []
-                    for p in self.engine_cls.zynapi_get_presets(b):
-                        prow = {
-                            'id': i,
-                            'text': p['text'],
-                            'name': p['name'],
-                            'fullpath': p['fullpath'],
-                            'readonly': p['readonly'] or b['readonly'],
-                            'bank_fullpath': b['fullpath'],
-                            'node_type': 'PRESET',
-                            'icon': "glyphicon glyphicon-link" if p['readonly'] else None
-                        }
-                        i += 1
-                        presets_data.append(prow)
-
-                    brow['nodes'] = presets_data
-
-                except Exception as e:
-                    logging.error("PRESET NODE {} => {}".format(i, e))
-
+                # Preset count, only if already known
+                presets = preset_tree_cache.get_cached_presets(self.eng_code, b)
+                if presets is not None:
+                    brow['tags'] = [str(len(presets))]
                 banks_data.append(brow)
 
             if banks_data:
@@ -397,8 +394,22 @@ class PresetsConfigHandler(ZynthianBasicHandler):
                     superbanks_data = banks_data
 
         except Exception as e:
-            logging.error("BANK NODE {} => {}".format(i, e))
+            logging.error("BANK NODES => {}".format(e))
 
         return superbanks_data
 
+    def get_bank_presets_data(self, b):
+        presets_data = []
+        for p in preset_tree_cache.get_presets(self.eng_code, self.engine_cls, b):
+            presets_data.append({
+                'text': p['text'],
+                'name': p['name'],
+                'fullpath': p['fullpath'],
+                'readonly': p['readonly'] or b['readonly'],
+                'bank_fullpath': b['fullpath'],
+                'node_type': 'PRESET',
+                'icon': "glyphicon glyphicon-link" if p['readonly'] else None
+            })
+        return presets_data
+
 # ------------------------------------------------------------------------------
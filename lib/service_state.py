@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Systemd Service State Registry
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+import time
+import logging
+import threading
+from subprocess import run, PIPE, DEVNULL
+
+# ------------------------------------------------------------------------------
+# Service State Registry
+# ------------------------------------------------------------------------------
+
+
+class ServiceStateRegistry:
+    """
+    Keeps the state of a list of watched systemd units, shared by every handler.
+    All the watched units are queried at once with a single "systemctl is-active"
+    call, and the result is cached for a short time.
+    """
+
+    def __init__(self, units, ttl=2.0):
+        self.lock = threading.Lock()
+        self.units = list(units)
+        self.ttl = ttl
+        self.states = {}
+        self.timestamp = None
+        self.queries = 0
+
+    def watch(self, unit):
+        """Add a unit to the watched list. Return True if it was not watched yet."""
+        with self.lock:
+            if unit in self.units:
+                return False
+            self.units.append(unit)
+            self.timestamp = None
+            return True
+
+    def refresh(self):
+        units = list(self.units)
+        try:
+            res = run(["systemctl", "is-active"] + units, stdout=PIPE, stderr=DEVNULL, encoding="utf-8")
+            states = res.stdout.splitlines()
+        except Exception as e:
+            logging.error(f"Can't get services state => {e}")
+            states = []
+        # systemctl prints a line per unit, in the same order
+        if len(states) != len(units):
+            states = ["unknown"] * len(units)
+        self.states = dict(zip(units, states))
+        self.timestamp = time.monotonic()
+        self.queries += 1
+
+    def get_state(self, unit, max_age=None):
+        if max_age is None:
+            max_age = self.ttl
+        self.watch(unit)
+        with self.lock:
+            if self.timestamp is None or time.monotonic() - self.timestamp > max_age:
+                self.refresh()
+            return self.states.get(unit, "unknown")
+
+    def is_active(self, unit, max_age=None):
+        return self.get_state(unit, max_age) == "active"
+
+
+service_state = ServiceStateRegistry([
+    "zynthian",
+    "mod-ui",
+    "novnc0",
+    "novnc1",
+    "filebrowser",
+    "jacknetumpd",
+    "jackrtpmidid",
+    "qmidinet",
+    "touchosc2midi"
+])
+
+# ------------------------------------------------------------------------------
@@ -32,9 +32,23 @@ import logging
 import tornado.web
 from collections import OrderedDict
 
+from lib.file_download import send_file, send_zip, iter_dir_entries
+from lib.file_info_cache import FileInfoCache
 from lib.zynthian_config_handler import ZynthianBasicHandler
 from zyngine.zynthian_legacy_snapshot import zynthian_legacy_snapshot
 
+# ------------------------------------------------------------------------------
+# Snapshot Index: converted snapshot details, keyed by path+mtime+size
+# ------------------------------------------------------------------------------
+
+snapshot_index = FileInfoCache("snapshot_index")
+
+
+def load_snapshot_details(fpath):
+    logging.debug(f"Getting snapshot details for '{fpath}' ...")
+    with open(fpath) as ssfile:
+        return zynthian_legacy_snapshot().convert_state(json.load(ssfile))
+
 # ------------------------------------------------------------------------------
 # Snapshot Config Handler
 # ------------------------------------------------------------------------------
@@ -49,6 +63,10 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
     PROFILES_DIRECTORY = "%s/midi-profiles" % os.environ.get(
         "ZYNTHIAN_CONFIG_DIR")
 
+    def prepare(self):
+        super().prepare()
+        self.ssdata = None
+
     @tornado.web.authenticated
     def get(self, errors=None):
         config = OrderedDict([])
@@ -69,10 +87,23 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
         # Try to maintain selection after a POST action...
         config['SEL_NODE_ID'] = self.get_selected_node_id(ssdata)
 
+        # Forget details of snapshots removed from outside webconf
+        snapshot_index.purge()
+        snapshot_index.save()
+
         super().get("snapshots.html", "Snapshots", config, errors)
 
     @tornado.web.authenticated
     def post(self, action):
+        # Read-only actions for lazy loading the tree & snapshot details
+        if action in ('get_tree', 'get_details'):
+            result = {
+                'get_tree': lambda: self.get_tree_result(),
+                'get_details': lambda: self.do_get_details()
+            }[action]()
+            self.write(result)
+            return
+
         if action:
             result = {
                 'new_bank': lambda: self.do_new_bank(),
@@ -82,7 +113,15 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
                 'save_as_default': lambda: self.do_save_as_default(),
                 'save_as_last_state': lambda: self.do_save_as_last_state()
             }[action]()
+            # Snapshot tree must be refreshed after any action
+            self.ssdata = None
+            snapshot_index.save()
 
+        result.update(self.get_tree_result())
+        self.write(result)
+
+    def get_tree_result(self):
+        result = {}
         ssdata = self.get_snapshots_data()
         result['SNAPSHOTS'] = ssdata
         result['SEL_NODE_ID'] = self.get_selected_node_id(ssdata)
@@ -92,8 +131,17 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
         snapshot_warning = self.get_snapshot_warning(ssdata)
         if snapshot_warning:
             result['errors'] = snapshot_warning
+        return result
 
-        self.write(result)
+    def do_get_details(self):
+        result = {}
+        fullpath = self.get_argument('SEL_FULLPATH')
+        if os.path.isfile(fullpath) and fullpath.endswith(".zss"):
+            result['prog_details'] = self.get_snapshot_details(fullpath)
+            snapshot_index.save()
+        else:
+            result['errors'] = "Snapshot doesn't exist: {}".format(fullpath)
+        return result
 
     def do_new_bank(self):
         result = {}
@@ -118,6 +166,7 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
                 shutil.rmtree(fullPath)
             else:
                 os.remove(fullPath)
+            snapshot_index.remove(fullPath)
         return result
 
     def do_save(self):
@@ -163,6 +212,7 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
 
         try:
             os.rename(fullPath, newFullPath)
+            snapshot_index.move(fullPath, newFullPath)
         except OSError:
             result['errors'] = 'Move ' + fullPath + \
                 ' to ' + newFullPath + ' failed!'
@@ -190,6 +240,7 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
         src = self.get_argument('SEL_FULLPATH')
         logging.info("Copy %s to %s" % (src, dest))
         shutil.copyfile(src, dest)
+        self.copy_snapshot_details(src, dest)
         return result
 
     def do_save_as_last_state(self):
@@ -198,6 +249,7 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
         src = self.get_argument('SEL_FULLPATH')
         logging.info("Copy %s to %s" % (src, dest))
         shutil.copyfile(src, dest)
+        self.copy_snapshot_details(src, dest)
         return result
 
     def get_existing_banks(self, snapshot_data, incl_name):
@@ -238,15 +290,46 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
         return ''
 
     def get_snapshots_data(self):
-        return self.walk_directory(SnapshotConfigHandler.SNAPSHOTS_DIRECTORY)
+        # Walk the snapshot tree only once per request.
+        # Snapshot details are not included. They are loaded on demand (get_details).
+        if self.ssdata is None:
+            self.ssdata = self.walk_directory(SnapshotConfigHandler.SNAPSHOTS_DIRECTORY)
+        return self.ssdata
+
+    @staticmethod
+    def get_snapshot_details(fpath, st=None):
+        try:
+            return snapshot_index.get(fpath, load_snapshot_details, st)
+        except Exception as e:
+            logging.error(f"Can't get snapshot details for '{fpath}' => {e}")
+            return ""
+
+    @staticmethod
+    def copy_snapshot_details(src, dest):
+        try:
+            snapshot_index.copy(src, dest, load_snapshot_details)
+            snapshot_index.save()
+        except Exception as e:
+            logging.error(f"Can't get snapshot details for '{dest}' => {e}")
+
+    @staticmethod
+    def update_snapshot_details(fpath):
+        # The snapshot is already saved => errors are only logged, and the entry dropped
+        try:
+            snapshot_index.update(fpath, load_snapshot_details)
+        except Exception as e:
+            logging.error(f"Can't update snapshot details for '{fpath}' => {e}")
+            snapshot_index.remove(fpath)
+        snapshot_index.save()
 
     def walk_directory(self, directory, idx=0, _bank_num=None, _bank_name=None):
         snapshots = []
-        file_list = sorted(os.listdir(directory))
-        for f in file_list:
-            fullpath = os.path.join(directory, f)
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            f = entry.name
+            fullpath = entry.path
+            is_dir = entry.is_dir()
             state = {}
-            if os.path.isdir(fullpath):
+            if is_dir:
                 node_type = "BANK"
                 parts = f.split("-", 1)
                 if f[0] == ".":
@@ -280,14 +363,7 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
                         prog_num = ''
                         prog_name = fname
                     name = prog_name
-
-                    try:
-                        logging.debug(f"Getting snapshot details for '{fullpath}' ...")
-                        with open(fullpath) as ssfile:
-                            prog_details = zynthian_legacy_snapshot().convert_state(json.load(ssfile))
-                    except Exception as e:
-                        logging.error(f"Can't get snapshot details for '{fullpath}' => {e}")
-                        prog_details = ""
+                    prog_details = None
                 else:
                     continue
 
@@ -306,7 +382,7 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
             }
 
             idx += 1
-            if os.path.isdir(fullpath):
+            if is_dir:
                 snapshot['nodes'] = self.walk_directory(fullpath, idx, bank_num, bank_name)
                 idx += len(snapshot['nodes'])
 
@@ -349,6 +425,8 @@ class SnapshotConfigHandler(ZynthianBasicHandler):
                                      os.path.basename(fpath))
         logging.info(destination)
         shutil.move(fpath, destination)
+        if destination.endswith(".zss"):
+            self.get_snapshot_details(destination)
 
 
 class SnapshotRemoveChainHandler(tornado.web.RequestHandler):
@@ -370,6 +448,7 @@ class SnapshotRemoveChainHandler(tornado.web.RequestHandler):
 
             with open(snapshot_file, "w") as fp:
                 json.dump(data, fp)
+            SnapshotConfigHandler.update_snapshot_details(snapshot_file)
 
             result = data
 
@@ -401,6 +480,7 @@ class SnapshotRemoveOptionHandler(tornado.web.RequestHandler):
 
             with open(snapshot_file, "w") as fp:
                 json.dump(data, fp)
+            SnapshotConfigHandler.update_snapshot_details(snapshot_file)
 
             result = data
 
@@ -452,6 +532,7 @@ class SnapshotAddOptionsHandler(tornado.web.RequestHandler):
             with open(snapshot_file, "w") as fp:
                 json.dump(data, fp)
                 fp.close()
+            SnapshotConfigHandler.update_snapshot_details(snapshot_file)
 
             result = data
 
@@ -470,42 +551,19 @@ class SnapshotDownloadHandler(tornado.web.RequestHandler):
         return self.get_secure_cookie("user")
 
     @tornado.web.authenticated
-    def get(self, fpath_b64):
+    async def get(self, fpath_b64):
         result = None
-        fpath = None
-        delete = False
         try:
             fpath = str(base64.b64decode(fpath_b64), 'utf-8')
             dname, fname = os.path.split(fpath)
             if os.path.isdir(fpath):
-                zfpath = TMP_DIR + "/" + fname
-                shutil.make_archive(zfpath, 'zip', fpath)
-                fpath = zfpath + ".zip"
-                fname += ".zip"
-                delete = True
-                mime_type = "application/zip"
+                # Zip the directory on the fly, straight into the response
+                await send_zip(self, fname + ".zip", iter_dir_entries(fpath))
             else:
-                delete = False
-                mime_type = "application/octet-stream"
-
-            self.set_header('Content-Type', mime_type)
-            self.set_header("Content-Description", "File Transfer")
-            self.set_header('Content-Disposition',
-                            'attachment; filename="{}"'.format(fname))
-            with open(fpath, 'rb') as f:
-                while True:
-                    data = f.read(4096)
-                    if not data:
-                        break
-                    self.write(data)
-                self.finish()
+                await send_file(self, fpath, fname)
 
         except Exception as e:
             logging.error(e)
             result = {'errors': "Can't download file: {}".format(e)}
 
-        finally:
-            if fpath and delete:
-                os.remove(fpath)
-
         return result
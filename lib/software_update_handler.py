@@ -22,15 +22,15 @@
 #
 # ********************************************************************
 
+import shlex
 import logging
 
 import tornado.web
 import tornado.websocket
 from collections import OrderedDict
-import subprocess
-import jsonpickle
+from lib.background_job import SubprocessJob, background_jobs
 from lib.zynthian_config_handler import ZynthianBasicHandler
-from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler, ZynthianWebSocketMessage
+from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler
 
 UPDATE_COMMANDS = OrderedDict([
     # ['Diagnosis', 'echo "Not implemented yet"'],
@@ -39,6 +39,8 @@ UPDATE_COMMANDS = OrderedDict([
 ]
 )
 
+UPDATE_JOB_KEY = "software_update"
+
 # ------------------------------------------------------------------------------
 # SoftwareUpdateHandler Config Handler
 # ------------------------------------------------------------------------------
@@ -54,19 +56,49 @@ class SoftwareUpdateHandler(ZynthianBasicHandler):
 
 
 class SoftwareUpdateMessageHandler(ZynthianWebSocketMessageHandler):
-    @classmethod
-    def is_registered_for(cls, handler_name):
-        return handler_name == 'SoftwareUpdateMessageHandler'
+    """
+    Runs the update commands as background jobs and streams their output.
+    Messages:
+        "<update command>": start the command (or join the running update)
+        "RESUME [<job id> <offset>]": resume the output of a job from a byte offset.
+            Without job ID, join the running update, if any.
+    """
+
+    def __init__(self, handler_name, websocket):
+        super().__init__(handler_name, websocket)
+        self.job = None
+
+    def on_websocket_message(self, message):
+        parts = message.split(" ")
+        if parts[0] == "RESUME":
+            job = None
+            offset = 0
+            if len(parts) == 3:
+                job = background_jobs.get(parts[1])
+                try:
+                    offset = max(0, int(parts[2]))
+                except ValueError:
+                    logging.error("Bad update message: {}".format(message))
+            if job is None:
+                job = background_jobs.find(UPDATE_JOB_KEY)
+                offset = 0
+                if job is None or (len(parts) < 3 and not job.is_running()):
+                    self.send({'job': None})
+                    return
+            self.attach_job(job, offset)
+        elif message in UPDATE_COMMANDS:
+            job = background_jobs.start(SubprocessJob(UPDATE_JOB_KEY, shlex.split(UPDATE_COMMANDS[message]), message))
+            self.attach_job(job, 0)
+        else:
+            logging.error("Unknown update command: {}".format(message))
 
-    def on_websocket_message(self, update_command):
-        p = subprocess.Popen(
-            UPDATE_COMMANDS[update_command], shell=True, stderr=subprocess.STDOUT, stdout=subprocess.PIPE)
-        for line in p.stdout:
-            logging.info(line.decode())
-            message = ZynthianWebSocketMessage(
-                'SoftwareUpdateMessageHandler', line.decode())
-            self.websocket.write_message(jsonpickle.encode(message))
+    def attach_job(self, job, offset):
+        if self.job:
+            self.job.detach(self.send)
+        self.job = job
+        job.attach(self.send, offset)
 
-        message = ZynthianWebSocketMessage(
-            'SoftwareUpdateMessageHandler', "EOCOMMAND")
-        self.websocket.write_message(jsonpickle.encode(message))
+    def on_close(self):
+        if self.job:
+            self.job.detach(self.send)
+            self.job = None
@@ -26,13 +26,26 @@ import os
 import time
 import logging
 import zipfile
-import jsonpickle
+import threading
 import tornado.web
-from io import BytesIO
-from pathlib import Path
+import tornado.ioloop
+from tornado.iostream import StreamClosedError
+from concurrent.futures import ThreadPoolExecutor
 
+from lib.zip_stream import ZipStream
+from lib.backup_planner import BackupItemMatcher, BackupPlan, config_backup_planner, data_backup_planner
+from lib.background_job import background_jobs
 from lib.zynthian_config_handler import ZynthianBasicHandler
-from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler, ZynthianWebSocketMessage
+from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler
+
+RESTORE_JOB_KEY = "restore_backup"
+# Restore members bigger than this are extracted in parallel, by the restore workers
+RESTORE_LARGE_MEMBER_SIZE = 4 * 1024 * 1024
+RESTORE_WORKERS = 3
+# Min interval between restore progress summaries (seconds)
+RESTORE_PROGRESS_INTERVAL = 1.0
+
+MB = 1024 * 1024
 
 
 # ------------------------------------------------------------------------------
@@ -66,11 +79,23 @@ class SystemBackupHandler(ZynthianBasicHandler):
         res += cls.get_backup_items(cls.DATA_BACKUP_ITEMS_FILE)
         return res
 
+    @classmethod
+    def get_config_backup_plan(cls):
+        return config_backup_planner.get_plan(cls.get_config_backup_items())
+
+    @classmethod
+    def get_data_backup_plan(cls):
+        return data_backup_planner.get_plan(cls.get_data_backup_items())
+
+    @classmethod
+    def get_all_backup_plan(cls):
+        return BackupPlan.merge([cls.get_config_backup_plan(), cls.get_data_backup_plan()])
+
     @tornado.web.authenticated
-    def get(self, errors=None):
-        self.do_get("BACKUP/RESTORE", errors)
+    async def get(self, errors=None):
+        await self.do_get("BACKUP/RESTORE", errors)
 
-    def do_get(self, active_tab="BACKUP/RESTORE", errors=None):
+    async def do_get(self, active_tab="BACKUP/RESTORE", errors=None):
         config = {
             'ACTIVE_TAB': active_tab,
             'ZYNTHIAN_UPLOAD_MULTIPLE': True,
@@ -79,54 +104,54 @@ class SystemBackupHandler(ZynthianBasicHandler):
             'CONFIG_BACKUP_DIRS_EXCLUDED': [],
             'DATA_BACKUP_ITEMS': {},
             'DATA_BACKUP_DIRS': [],
-            'DATA_BACKUP_DIRS_EXCLUDED': []
+            'DATA_BACKUP_DIRS_EXCLUDED': [],
+            'BACKUP_SIZES': {}
         }
 
-        config_backup_items = self.get_config_backup_items()
-        for item in config_backup_items:
+        for item in self.get_config_backup_items():
             if item.startswith("^"):
                 config['CONFIG_BACKUP_DIRS_EXCLUDED'].append(item[1:])
             else:
                 config['CONFIG_BACKUP_DIRS'].append(item)
 
-        data_backup_items = self.get_data_backup_items()
-        for item in data_backup_items:
+        for item in self.get_data_backup_items():
             if item.startswith("^"):
                 config['DATA_BACKUP_DIRS_EXCLUDED'].append(item[1:])
             else:
                 config['DATA_BACKUP_DIRS'].append(item)
 
-        def add_config_backup_item(dirname, subdirs, files):
-            if dirname not in config['CONFIG_BACKUP_ITEMS']:
-                config['CONFIG_BACKUP_ITEMS'][dirname] = []
-            for fname in files:
-                config['CONFIG_BACKUP_ITEMS'][dirname].append(fname)
-
-        def add_data_backup_item(dirname, subdirs, files):
-            if dirname not in config['DATA_BACKUP_ITEMS']:
-                config['DATA_BACKUP_ITEMS'][dirname] = []
-            for fname in files:
-                config['DATA_BACKUP_ITEMS'][dirname].append(fname)
+        # Plans are cached => walking the backup dirs is only needed if something changed
+        ioloop = tornado.ioloop.IOLoop.current()
+        config_plan = await ioloop.run_in_executor(None, self.get_config_backup_plan)
+        data_plan = await ioloop.run_in_executor(None, self.get_data_backup_plan)
+        all_plan = BackupPlan.merge([config_plan, data_plan])
 
-        self.walk_backup_items(add_config_backup_item, config_backup_items)
-        self.walk_backup_items(add_data_backup_item, data_backup_items)
+        config['CONFIG_BACKUP_ITEMS'] = config_plan.get_tree()
+        config['DATA_BACKUP_ITEMS'] = data_plan.get_tree()
+        for command, plan in (('BACKUP_ALL', all_plan), ('BACKUP_CONFIG', config_plan), ('BACKUP_DATA', data_plan)):
+            config['BACKUP_SIZES'][command] = {
+                'files': plan.total_files,
+                'size': plan.zip_size
+            }
 
         super().get("backup.html", "Backup / Restore", config, errors)
 
     @tornado.web.authenticated
-    def post(self):
+    async def post(self):
         command = self.get_argument('_command', '')
         logging.info("COMMAND = {}".format(command))
         if command:
-            errors = {
-                # 'RESTORE': pass,
-                'BACKUP_ALL': lambda: self.do_backup_all(),
-                'BACKUP_CONFIG': lambda: self.do_backup_config(),
-                'BACKUP_DATA': lambda: self.do_backup_data(),
-                'SAVE_BACKUP_CONFIG': lambda: self.do_save_backup_config()
-            }[command]()
-
-    def do_save_backup_config(self):
+            if command == 'SAVE_BACKUP_CONFIG':
+                await self.do_save_backup_config()
+            else:
+                await {
+                    # 'RESTORE': pass,
+                    'BACKUP_ALL': lambda: self.do_backup_all(),
+                    'BACKUP_CONFIG': lambda: self.do_backup_config(),
+                    'BACKUP_DATA': lambda: self.do_backup_data()
+                }[command]()
+
+    async def do_save_backup_config(self):
         # Save "Config" items
         backup_dirs = ''
         for dpath in self.get_argument('CONFIG_BACKUP_DIRS_EXCLUDED').split("\n"):
@@ -147,108 +172,182 @@ class SystemBackupHandler(ZynthianBasicHandler):
 
         # Reload active tab
         active_tab = self.get_argument("ACTIVE_TAB", "BACKUP/RESTORE")
-        self.do_get(active_tab)
+        await self.do_get(active_tab)
 
-    def do_backup_all(self):
-        backup_items = self.get_all_backup_items()
-        self.do_backup('zynthian_backup', backup_items)
+    async def do_backup_all(self):
+        await self.do_backup('zynthian_backup', self.get_all_backup_plan)
 
-    def do_backup_config(self):
-        backup_items = self.get_config_backup_items()
-        self.do_backup('zynthian_config_backup', backup_items)
+    async def do_backup_config(self):
+        await self.do_backup('zynthian_config_backup', self.get_config_backup_plan)
 
-    def do_backup_data(self):
-        backup_items = self.get_data_backup_items()
-        self.do_backup('zynthian_data_backup', backup_items)
+    async def do_backup_data(self):
+        await self.do_backup('zynthian_data_backup', self.get_data_backup_plan)
 
-    def do_backup(self, fname_prefix, backup_items):
+    async def do_backup(self, fname_prefix, get_plan):
+        plan = await tornado.ioloop.IOLoop.current().run_in_executor(None, get_plan)
         zipname = '{0}{1}.zip'.format(
             fname_prefix, time.strftime("%Y%m%d-%H%M%S"))
-        f = BytesIO()
-        zf = zipfile.ZipFile(f, "w")
-
-        def zip_backup_items(dirname, subdirs, files):
-            logging.info(dirname)
-            if dirname != '/':
-                zf.write(dirname)
-            for filename in files:
-                logging.info(filename)
-                zf.write(os.path.join(dirname, filename))
-
-        self.walk_backup_items(zip_backup_items, backup_items)
-
-        zf.close()
         self.set_header('Content-Type', 'application/zip')
         self.set_header('Content-Disposition',
                         'attachment; filename=%s' % zipname)
 
-        self.write(f.getvalue())
-        f.close()
-        self.finish()
-
-    def walk_backup_items(self, worker, backup_items):
-        valitem_info = self.get_valitem_info(backup_items)
-        for bdir in valitem_info["bdirs"]:
-            for dirname, subdirs, files in os.walk(bdir):
-                if not any(Path(dirname).match(xpat) for xpat in valitem_info["xpats"]):
-                    worker(dirname, subdirs, files)
-
-    @classmethod
-    def get_valitem_info(cls, backup_items=None):
-        xpats = []
-        bdirs = []
-        if not backup_items:
-            backup_items = cls.get_all_backup_items()
-        for bitem in backup_items:
-            bitem = os.path.expandvars(bitem)
-            if bitem.startswith("^"):
-                xpats.append(bitem[1:])
-            else:
-                bdirs.append(bitem)
-        return {
-            "xpats": xpats,
-            "bdirs": bdirs
-        }
+        # The archive is sent while it's being built, chunk by chunk
+        zs = ZipStream()
+        try:
+            for dirname, files in plan.dirs:
+                logging.info(dirname)
+                if dirname != '/':
+                    await self.write_chunk(zs.add_dir(dirname))
+                for filename in files:
+                    logging.info(filename)
+                    try:
+                        for chunk in zs.add_file(os.path.join(dirname, filename)):
+                            await self.write_chunk(chunk)
+                    except StreamClosedError:
+                        raise
+                    except OSError as e:
+                        # Headers are already sent => skip the file
+                        logging.error("Can't backup '{}' => {}".format(os.path.join(dirname, filename), e))
+
+            await self.write_chunk(zs.close())
+            self.finish()
+        except StreamClosedError:
+            logging.info("Backup '{}' cancelled by client".format(zipname))
+
+    async def write_chunk(self, chunk):
+        if chunk:
+            self.write(chunk)
+            await self.flush()
+
+
+class RestoreProgress:
+    """Counts the restored files & bytes, sending a summary to the job at most once per interval."""
+
+    def __init__(self, job, total_files, total_bytes):
+        self.job = job
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.t0 = time.monotonic()
+        self.last_report = self.t0
+
+    def add(self, zinfo):
+        with self.lock:
+            self.files += 1
+            self.bytes += zinfo.file_size
+            now = time.monotonic()
+            if now - self.last_report < RESTORE_PROGRESS_INTERVAL:
+                return
+            self.last_report = now
+        self.report()
+
+    def report(self):
+        with self.lock:
+            files = self.files
+            nbytes = self.bytes
+        elapsed = time.monotonic() - self.t0
+        summary = "Restored {}/{} files, {:.1f}/{:.1f} MB".format(
+            files, self.total_files, nbytes / MB, self.total_bytes / MB)
+        if self.total_bytes:
+            self.job.report_progress(100 * nbytes / self.total_bytes)
+            if 0 < nbytes < self.total_bytes:
+                summary += ", ETA {:.0f}s".format(elapsed * (self.total_bytes - nbytes) / nbytes)
+        self.job.log(summary)
 
 
 class RestoreMessageHandler(ZynthianWebSocketMessageHandler):
+    """Restores an uploaded backup file as a background job, streaming the job output."""
 
-    @classmethod
-    def is_registered_for(cls, handler_name):
-        return handler_name == 'RestoreMessageHandler'
-
-    def is_valid_restore_item(self, restore_item):
-        restore_item = "/" + restore_item
-        for xpat in self.valitem_info["xpats"]:
-            if Path(restore_item).match(xpat):
-                return False
-        for bdir in self.valitem_info["bdirs"]:
-            if str(restore_item).startswith(bdir):
-                return True
-        return False
+    def __init__(self, handler_name, websocket):
+        super().__init__(handler_name, websocket)
+        self.job = None
 
     def on_websocket_message(self, restore_file):
-        # fileinfo = self.request.files['ZYNTHIAN_RESTORE_FILE'][0]
-        # restore_file = fileinfo['filename']
-        with open(restore_file, "rb") as f:
-            self.valitem_info = SystemBackupHandler.get_valitem_info()
-            with zipfile.ZipFile(f, 'r') as restoreZip:
-                for member in restoreZip.namelist():
-                    if self.is_valid_restore_item(member):
-                        log_message = "Restored: " + member
-                        restoreZip.extract(member, "/")
-                        logging.debug(log_message)
-                        message = ZynthianWebSocketMessage(
-                            'RestoreMessageHandler', log_message)
-                        self.websocket.write_message(
-                            jsonpickle.encode(message))
+        running = background_jobs.find(RESTORE_JOB_KEY)
+        if running and running.is_running():
+            logging.error("Can't restore '{}': a restore is already running".format(restore_file))
+            try:
+                os.remove(restore_file)
+            except Exception as e:
+                logging.error("Can't remove '{}' => {}".format(restore_file, e))
+            self.send({'text': "ERROR: A restore is already running. Try again when finished.\n"})
+            self.send({'state': "failed"})
+            return
+        job = background_jobs.submit(RESTORE_JOB_KEY, self.do_restore, restore_file, title="Restoring backup")
+        job.page = "/sys-backup"
+        if self.job:
+            self.job.detach(self.send)
+        self.job = job
+        job.attach(self.send)
+
+    def on_close(self):
+        if self.job:
+            self.job.detach(self.send)
+            self.job = None
+
+    @staticmethod
+    def do_restore(job, restore_file):
+        matcher = BackupItemMatcher(SystemBackupHandler.get_all_backup_items())
+        errors = []
+        # ZipFile isn't thread-safe => every worker thread opens its own
+        local = threading.local()
+        worker_zips = []
+
+        def get_zip():
+            if threading.current_thread() is job_thread:
+                return restore_zip
+            if not hasattr(local, "zip"):
+                local.zip = zipfile.ZipFile(restore_file, 'r')
+                worker_zips.append(local.zip)
+            return local.zip
+
+        def extract(zinfo):
+            if job.is_cancelled():
+                return
+            try:
+                get_zip().extract(zinfo, "/")
+                progress.add(zinfo)
+            except Exception as e:
+                logging.error("Can't restore '{}' => {}".format(zinfo.filename, e))
+                job.log("Can't restore '{}' => {}".format(zinfo.filename, e))
+                errors.append(zinfo.filename)
+
+        job_thread = threading.current_thread()
+        try:
+            with zipfile.ZipFile(restore_file, 'r') as restore_zip:
+                members = []
+                for zinfo in restore_zip.infolist():
+                    if matcher.is_included("/" + zinfo.filename):
+                        members.append(zinfo)
                     else:
-                        logging.warning(
-                            "Restore of " + member + " not allowed")
-                restoreZip.close()
-            f.close()
-        os.remove(restore_file)
+                        logging.warning("Restore of " + zinfo.filename + " not allowed")
+                job.log("Restoring {} files from {}".format(len(members), os.path.basename(restore_file)))
+                progress = RestoreProgress(job, len(members), sum(zinfo.file_size for zinfo in members))
+
+                # Create the parent directories first, so members can be extracted concurrently
+                dpaths = set()
+                for zinfo in members:
+                    parts = [p for p in zinfo.filename.split("/") if p not in ("", ".", "..")]
+                    dpaths.add(os.path.join("/", *parts[:-1]))
+                for dpath in sorted(dpaths):
+                    os.makedirs(dpath, exist_ok=True)
+
+                # Large members are extracted by the workers while this thread extracts the rest
+                with ThreadPoolExecutor(max_workers=RESTORE_WORKERS, thread_name_prefix="restore") as workers:
+                    for zinfo in members:
+                        if zinfo.file_size >= RESTORE_LARGE_MEMBER_SIZE:
+                            workers.submit(extract, zinfo)
+                    for zinfo in members:
+                        if zinfo.file_size < RESTORE_LARGE_MEMBER_SIZE:
+                            extract(zinfo)
+                progress.report()
+        finally:
+            for wzip in worker_zips:
+                wzip.close()
+            os.remove(restore_file)
+
         SystemBackupHandler.update_sys()
-        message = ZynthianWebSocketMessage(
-            'RestoreMessageHandler', 'EOCOMMAND')
-        self.websocket.write_message(jsonpickle.encode(message))
+        if errors:
+            return "{} files couldn't be restored".format(len(errors))
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# System Metrics: native /proc & /sys readers
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+# These functions replace the shell-outs (free, df, findmnt, mountpoint,
+# hostname -I, vcgencmd) used by the dashboard, returning the same output
+# shapes without forking any process.
+
+import os
+import re
+import math
+import fcntl
+import socket
+import struct
+import logging
+
+MEMINFO_FPATH = "/proc/meminfo"
+MOUNTINFO_FPATH = "/proc/self/mountinfo"
+THERMAL_ZONE_FPATH = "/sys/class/thermal/thermal_zone0/temp"
+HOSTNAME_FPATH = "/etc/hostname"
+
+SIOCGIFADDR = 0x8915
+
+NA_VOLUME_INFO = {'fs': 'NA', 'total': 'NA', 'used': 'NA', 'free': 'NA', 'usage': 'NA'}
+
+# ------------------------------------------------------------------------------
+# Helpers
+# ------------------------------------------------------------------------------
+
+
+def human_size(nbytes):
+    """Format a size like 'df -h' does: powers of 1024, rounding up, 1 decimal below 10"""
+    size = nbytes
+    unit = ""
+    for unit in ("", "K", "M", "G", "T", "P"):
+        if size < 1024:
+            break
+        size /= 1024
+    if not unit:
+        return str(nbytes)
+    if size < 10:
+        size = math.ceil(size * 10) / 10
+        if size < 10:
+            return f"{size:.1f}{unit}"
+    return f"{math.ceil(size)}{unit}"
+
+
+def unescape_mountinfo(field):
+    """Decode the octal escapes (\\040, \\011, ...) used in /proc/self/mountinfo"""
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), field)
+
+
+def get_mounts():
+    """Return a list of dicts (devno, mount_point, fs, source) parsed from /proc/self/mountinfo"""
+    mounts = []
+    with open(MOUNTINFO_FPATH) as f:
+        for line in f:
+            parts = line.split(" - ", 1)
+            if len(parts) != 2:
+                continue
+            fields = parts[0].split()
+            sfields = parts[1].split()
+            if len(fields) < 5 or len(sfields) < 2:
+                continue
+            mounts.append({
+                'devno': fields[2],
+                'mount_point': unescape_mountinfo(fields[4]),
+                'fs': sfields[0],
+                'source': unescape_mountinfo(sfields[1])
+            })
+    return mounts
+
+
+def find_mount(volume):
+    """Find the mount of a volume, given its mount point or its source device. Last mount wins."""
+    res = None
+    for mount in get_mounts():
+        if volume in (mount['mount_point'], mount['source']):
+            res = mount
+    return res
+
+
+def resolve_block_device(mount):
+    """Resolve pseudo-devices like '/dev/root' to the real block device, using the major:minor numbers"""
+    try:
+        return "/dev/" + os.path.basename(os.readlink("/sys/dev/block/" + mount['devno']))
+    except OSError:
+        return mount['source']
+
+# ------------------------------------------------------------------------------
+# Memory & Storage
+# ------------------------------------------------------------------------------
+
+
+def get_meminfo():
+    """Return /proc/meminfo as a dictionary of integer values, in kB"""
+    meminfo = {}
+    with open(MEMINFO_FPATH) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2:
+                meminfo[parts[0].rstrip(':')] = int(parts[1])
+    return meminfo
+
+
+def get_ram_info():
+    meminfo = get_meminfo()
+    total = meminfo['MemTotal'] // 1024
+    free = meminfo['MemFree'] // 1024
+    # Same as "free" (procps-ng >= 4): used = total - available
+    used = (meminfo['MemTotal'] - meminfo.get('MemAvailable', meminfo['MemFree'])) // 1024
+    return {'total': f"{total}M", 'used': f"{used}M", 'free': f"{free}M", 'usage': "{}%".format(int(100 * used / total))}
+
+
+def get_volume_info(volume="/"):
+    try:
+        mount = find_mount(volume)
+        st = os.statvfs(mount['mount_point'])
+        total = st.f_blocks * st.f_frsize
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        avail = st.f_bavail * st.f_frsize
+        if used + avail > 0:
+            usage = "{}%".format(math.ceil(100 * used / (used + avail)))
+        else:
+            usage = "-"
+        return {'fs': mount['fs'], 'total': human_size(total), 'used': human_size(used), 'free': human_size(avail), 'usage': usage}
+    except Exception as e:
+        logging.debug(f"Can't get volume info for '{volume}' => {e}")
+        return dict(NA_VOLUME_INFO)
+
+
+def get_root_device():
+    mount = find_mount("/")
+    if mount['source'] == "/dev/root":
+        return resolve_block_device(mount)
+    return mount['source']
+
+
+def get_media_info(mpath="/media/usb0"):
+    if os.path.ismount(mpath):
+        return get_volume_info(mpath)
+    return None
+
+# ------------------------------------------------------------------------------
+# Network
+# ------------------------------------------------------------------------------
+
+
+def get_host_name():
+    with open(HOSTNAME_FPATH) as f:
+        return f.readline().strip()
+
+
+def get_ipv4_addresses():
+    """Return the IPv4 address of every network interface, except loopback"""
+    ips = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        for index, ifname in socket.if_nameindex():
+            try:
+                res = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', ifname[:15].encode()))
+            except OSError:
+                # Interface without IPv4 address
+                continue
+            ip = socket.inet_ntoa(res[20:24])
+            if not ip.startswith("127."):
+                ips.append(ip)
+    return ips
+
+
+def get_ip():
+    return " ".join(get_ipv4_addresses())
+
+# ------------------------------------------------------------------------------
+# Temperature
+# ------------------------------------------------------------------------------
+
+
+def get_temperature():
+    try:
+        with open(THERMAL_ZONE_FPATH) as f:
+            return "{:.1f}ºC".format(int(f.read().strip()) / 1000)
+    except:
+        return "???"
+
+# ------------------------------------------------------------------------------
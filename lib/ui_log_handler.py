@@ -25,17 +25,14 @@
 
 import logging
 import time
-import asyncio
 import subprocess
-import jsonpickle
 import tornado.web
 from collections import OrderedDict
-from multiprocessing import Queue
 from subprocess import check_output
-from lib.tail_thread import TailThread, AsynchronousFileReader
 
+from lib.journal_stream import JournalSubscriber, journal_streams
 from lib.zynthian_config_handler import ZynthianBasicHandler
-from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler, ZynthianWebSocketMessage
+from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler
 
 
 # ------------------------------------------------------------------------------
@@ -54,65 +51,29 @@ class UiLogHandler(ZynthianBasicHandler):
         self.get()
 
 
-class UiTailThread(TailThread):
-
-    def __init__(self, websocket, loop, process_command):
-        TailThread.__init__(self, websocket, loop)
-        self.process_command = process_command
-        self.loop = loop
-
-    def run(self):
-        asyncio.set_event_loop(self.loop)
-        process = subprocess.Popen(self.process_command, shell=True, stderr=subprocess.PIPE,
-                                   stdout=subprocess.PIPE)
-
-        stdout_queue = Queue()
-        stdout_reader = AsynchronousFileReader(process.stdout, stdout_queue)
-        stdout_reader.start()
-        stderr_queue = Queue()
-        stderr_reader = AsynchronousFileReader(process.stderr, stderr_queue)
-        stderr_reader.start()
-
-        while self.is_running and (not stdout_reader.eof() or not stderr_reader.eof()):
-            while self.is_running and not stdout_queue.empty() and not stdout_reader.eof():
-                line = stdout_queue.get()
-                logging.info("stdout: %s" % line.decode())
-                message = ZynthianWebSocketMessage(
-                    'UiLogMessageHandler', line.decode())
-                self.websocket.write_message(jsonpickle.encode(message))
-
-            while self.is_running and not stderr_queue.empty() and not stderr_reader.eof():
-                line = stderr_queue.get()
-                logging.info("stderr: %s" % line.decode())
-                message = ZynthianWebSocketMessage(
-                    'UiLogMessageHandler', line.decode())
-                self.websocket.write_message(jsonpickle.encode(message))
-            time.sleep(0.01)
-
-        stdout_reader.join()
-        stderr_reader.join()
-        process.stdout.close()
-        process.stderr.close()
+class UiLogMessageHandler(ZynthianWebSocketMessageHandler):
 
+    def __init__(self, handler_name, websocket):
+        super().__init__(handler_name, websocket)
+        self.subscriber = None
 
-class UiLogMessageHandler(ZynthianWebSocketMessageHandler):
-    logging_thread = None
+    @staticmethod
+    def get_service_name(debug_logging):
+        return 'zynthian_debug' if debug_logging else 'zynthian'
 
-    @classmethod
-    def is_registered_for(cls, handler_name):
-        return handler_name == 'UiLogMessageHandler'
+    def start_journal_tail(self, debug_logging):
+        if self.subscriber is None:
+            self.subscriber = JournalSubscriber(self.send_log_lines)
+        journal_streams.subscribe(self.get_service_name(debug_logging), self.subscriber)
 
-    def get_process_command(self, debug_logging):
-        service_name = ('zynthian_debug' if debug_logging else 'zynthian')
-        logging.info("journalctl -f -u %s" % service_name)
-        return "journalctl  -f -u %s" % service_name
+    def stop_journal_tail(self):
+        if self.subscriber:
+            journal_streams.unsubscribe(self.subscriber)
+            self.subscriber = None
 
-    def spawn_tail_thread(self, debug_level):
-        logging.info("spawn_tail_thread")
-        loop = asyncio.get_event_loop()
-        UiLogMessageHandler.logging_thread = UiTailThread(
-            self.websocket, loop, self.get_process_command(debug_level))
-        UiLogMessageHandler.logging_thread.start()
+    async def send_log_lines(self, lines):
+        # A batch of lines is sent as a single frame
+        await self.send(lines)
 
     def toggle_service(self, running_service, next_service):
         check_output("(systemctl stop %s)&" % running_service, shell=True)
@@ -138,27 +99,21 @@ class UiLogMessageHandler(ZynthianWebSocketMessageHandler):
 
     def do_start_debug_logging(self):
         logging.info("start debug logging")
-        message = ZynthianWebSocketMessage(
-            'UiLogMessageHandler', 'Restarting UI in debug mode')
-        self.websocket.write_message(jsonpickle.encode(message))
-        if UiLogMessageHandler.logging_thread:
-            UiLogMessageHandler.logging_thread.stop()
+        self.send('Restarting UI in debug mode')
+        self.stop_journal_tail()
 
         self.toggle_service("zynthian", "zynthian_debug")
 
-        self.spawn_tail_thread(True)
+        self.start_journal_tail(True)
 
     def do_stop_debug_logging(self):
         logging.info("stop debug logging")
-        message = ZynthianWebSocketMessage(
-            'UiLogMessageHandler', 'Restarting UI in normal mode')
-        self.websocket.write_message(jsonpickle.encode(message))
-        if UiLogMessageHandler.logging_thread:
-            UiLogMessageHandler.logging_thread.stop()
+        self.send('Restarting UI in normal mode')
+        self.stop_journal_tail()
 
         self.toggle_service("zynthian_debug", "zynthian")
 
-        self.spawn_tail_thread(False)
+        self.start_journal_tail(False)
 
     def on_websocket_message(self, action):
         logging.debug("action: %s " % action)
@@ -167,13 +122,10 @@ class UiLogMessageHandler(ZynthianWebSocketMessageHandler):
         elif action == 'HIDE_DEBUG_LOGGING':
             self.do_stop_debug_logging()
         elif action == 'SHOW_DEFAULT':
-            if UiLogMessageHandler.logging_thread:
-                UiLogMessageHandler.logging_thread.stop()
-            self.spawn_tail_thread(False)
+            self.start_journal_tail(False)
         # this needs to show up early to get the socket working again.
         logging.debug("message handled.")
 
     def on_close(self):
-        logging.debug("stopping tail threads")
-        if UiLogMessageHandler.logging_thread:
-            UiLogMessageHandler.logging_thread.stop()
+        logging.debug("stopping journal tail")
+        self.stop_journal_tail()
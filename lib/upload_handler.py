@@ -25,11 +25,10 @@
 import logging
 import os.path
 import shutil
-import jsonpickle
 import tornado.websocket
 from tornadostreamform.multipart_streamer import MultiPartStreamer, TemporaryFileStreamedPart
 
-from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler, ZynthianWebSocketMessage
+from lib.zynthian_websocket_handler import ZynthianWebSocketMessageHandler
 
 # ------------------------------------------------------------------------------
 # Upload Handling
@@ -83,10 +82,7 @@ class UploadPostDataStreamer(MultiPartStreamer):
                     f"Upload progress: {new_percent}, received: {received}, total: {total}")
                 if self.webSocketHandler:
                     try:
-                        message = ZynthianWebSocketMessage(
-                            'UploadProgressHandler', str(new_percent))
-                        self.webSocketHandler.websocket.write_message(
-                            jsonpickle.encode(message))
+                        self.webSocketHandler.send(str(new_percent))
                     except:
                         logging.warning(
                             f"Can't send upload progress to websocket: {new_percent}")
@@ -125,20 +121,21 @@ class UploadPostDataStreamer(MultiPartStreamer):
 class UploadProgressHandler(ZynthianWebSocketMessageHandler):
     clientId = '1'
 
-    @classmethod
-    def is_registered_for(cls, handler_name):
-        return handler_name == 'UploadProgressHandler'
-
     def on_websocket_message(self, message):
+        progress_handlers = self.websocket.application.settings['upload_progress_handler']
         if message:
+            # The handler is reused for every message of the connection
+            if progress_handlers.get(self.clientId) is self:
+                del progress_handlers[self.clientId]
             self.clientId = message
-        self.websocket.application.settings['upload_progress_handler'][self.clientId] = self
+        progress_handlers[self.clientId] = self
         # logging.info("progress handler set for %s" % self.clientId)
 
     # client disconnected
     def on_close(self):
-        if self.clientId in self.websocket.application.settings['upload_progress_handler']:
-            del self.websocket.application.settings['upload_progress_handler'][self.clientId]
+        progress_handlers = self.websocket.application.settings['upload_progress_handler']
+        if progress_handlers.get(self.clientId) is self:
+            del progress_handlers[self.clientId]
 
 
 @tornado.web.stream_request_body
@@ -26,12 +26,12 @@ import os
 import re
 import logging
 import tornado.web
-from subprocess import check_output
 
 from zyngui.zynthian_gui import zynthian_gui
 from zynconf import CustomSwitchActionType, ZynSensorActionType
 
 from lib.dashboard_handler import DashboardHandler
+from lib.background_job import background_jobs
 from lib.zynthian_config_handler import ZynthianConfigHandler
 
 
@@ -1168,13 +1168,16 @@ class WiringConfigHandler(ZynthianConfigHandler):
         errors = super().update_config(data)
 
         if self.restart_ui_flag:
-            self.rebuild_zyncoder()
+            # The UI is restarted by the job, after rebuilding the library
+            job = self.rebuild_zyncoder(restart_ui=not self.reboot_flag)
+            if job:
+                self.follow_job(job)
+            else:
+                errors = self.REBUILD_RUNNING_ERROR
+            self.restart_ui_flag = False
         else:
             self.reload_wiring_layout_flag = True
 
-        if self.reboot_flag:
-            self.restart_ui_flag = False
-
         return errors
 
     @classmethod
@@ -1338,14 +1341,31 @@ class WiringConfigHandler(ZynthianConfigHandler):
             logging.warning(
                 "Can't delete wiring custom profile '{}': {}".format(fpath, e))
 
+    REBUILD_RUNNING_ERROR = "Zyncoder library is already being rebuilt. Save again when finished."
+
     @classmethod
-    def rebuild_zyncoder(cls):
-        try:
-            cmd = "cd %s/zyncoder/build;cmake ..;make" % os.environ.get(
-                'ZYNTHIAN_DIR')
-            check_output(cmd, shell=True)
-        except Exception as e:
-            logging.error("Rebuilding Zyncoder Library: %s" % e)
+    def rebuild_zyncoder(cls, restart_ui=False):
+        """
+        Rebuild the zyncoder library as a background job, restarting the UI when finished if requested.
+        Return the job, or None if a rebuild is already running: it was started with the previous config.
+        """
+        if background_jobs.is_running("rebuild_zyncoder"):
+            logging.error("Zyncoder library is already being rebuilt")
+            return None
+        return background_jobs.submit("rebuild_zyncoder", cls.do_rebuild_zyncoder, restart_ui,
+            title="Rebuilding Zyncoder Library")
+
+    @staticmethod
+    def do_rebuild_zyncoder(job, restart_ui):
+        cmd = "cd %s/zyncoder/build;cmake ..;make" % os.environ.get(
+            'ZYNTHIAN_DIR')
+        if job.run_command(cmd) != 0:
+            errors = "Rebuilding Zyncoder Library: %s" % job.last_line
+            logging.error(errors)
+            return errors
+        if restart_ui:
+            job.log("Restarting UI ...")
+            job.run_command("systemctl restart zynthian")
 
     # Load and return a custom profile
 
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Web Configurator
+#
+# Streaming Zip Writer
+#
+# Copyright (C) 2026 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+
+
+import zipfile
+
+# Size of the chunks emitted by the writer, and of the reads from source files
+CHUNK_SIZE = 256 * 1024
+
+# ------------------------------------------------------------------------------
+# Zip Stream
+# ------------------------------------------------------------------------------
+
+
+class ZipStream:
+    """
+    Zip archive writer emitting its output as a sequence of chunks, so an archive
+    of any size can be sent while it's being built, with bounded memory.
+    The archive is written to this object, which is not seekable, so zipfile uses
+    data descriptors after every entry and never needs to rewind the output.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, compression=zipfile.ZIP_STORED):
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.nbytes = 0
+        self.zf = zipfile.ZipFile(self, "w", compression=compression, allowZip64=True)
+
+    # Write-only file interface, used by zipfile
+
+    def write(self, data):
+        self.buffer += data
+        self.nbytes += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def tell(self):
+        # Used by zipfile for tracking the entry offsets. No seek() => no rewinding!
+        return self.nbytes
+
+    # Chunk interface
+
+    def pop_chunk(self):
+        """Return the pending output and empty the buffer."""
+        chunk = bytes(self.buffer)
+        self.buffer.clear()
+        return chunk
+
+    def add_dir(self, dpath, arcname=None):
+        """Add a directory entry. Return the pending output."""
+        zinfo = zipfile.ZipInfo.from_file(dpath, arcname)
+        self.zf.writestr(zinfo, b"")
+        return self.pop_chunk()
+
+    def add_file(self, fpath, arcname=None, compress_type=None):
+        """
+        Add a file entry, reading it in chunks. It's a generator yielding the output chunks.
+        The source file is opened before starting the entry, so an unreadable file
+        raises OSError without leaving a broken entry in the archive.
+        """
+        zinfo = zipfile.ZipInfo.from_file(fpath, arcname)
+        if compress_type is None:
+            zinfo.compress_type = self.zf.compression
+        else:
+            zinfo.compress_type = compress_type
+        with open(fpath, "rb") as src:
+            with self.zf.open(zinfo, "w") as dest:
+                while True:
+                    data = src.read(self.chunk_size)
+                    if not data:
+                        break
+                    dest.write(data)
+                    if len(self.buffer) >= self.chunk_size:
+                        yield self.pop_chunk()
+        if self.buffer:
+            yield self.pop_chunk()
+
+    def close(self):
+        """Write the central directory. Return the last output chunk."""
+        self.zf.close()
+        return self.pop_chunk()
+
+# ------------------------------------------------------------------------------
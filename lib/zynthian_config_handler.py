@@ -31,6 +31,9 @@ from subprocess import check_output
 
 import zynconf
 import zyngine.zynthian_lv2 as zynthian_lv2
+from lib.config_cache import config_cache
+from lib.background_job import background_jobs
+from lib.service_state import service_state
 
 # Avoid unwanted debug messages from zynconf module
 zynconf_logger = logging.getLogger('zynconf')
@@ -64,10 +67,8 @@ class ZynthianBasicHandler(tornado.web.RequestHandler):
         return self.get_secure_cookie("user", max_age_days=5200)
 
     def prepare(self):
-        zynconf.load_config()
-        zynconf.load_midi_config()
-
-        zynthian_lv2.load_engines()
+        # Reload config & engines only if the backing files have changed
+        config_cache.refresh()
         # zynthian_lv2.sanitize_engines()
 
         self.read_reboot_flag()
@@ -125,6 +126,9 @@ class ZynthianBasicHandler(tornado.web.RequestHandler):
         # Restore scroll position
         info['scrollTop'] = int(float(self.get_argument('_scrollTop', '0')))
 
+        # Background jobs started from the webconf pages
+        info['jobs'] = [job.get_status() for job in background_jobs.get_running() if job.page]
+
         super().render(tpl, info=info, **kwargs)
 
     @tornado.web.authenticated
@@ -151,12 +155,22 @@ class ZynthianBasicHandler(tornado.web.RequestHandler):
         else:
             self.render("config.html", body=body, config=config, title=title, errors=errors)
 
-    def is_service_active(self, service):
-        return zynconf.is_service_active(service)
+    def start_job(self, key, func, *args, title=None):
+        """Run func(job, *args) as a background job, followed from this page. Return the job."""
+        return self.follow_job(background_jobs.submit(key, func, *args, title=title))
+
+    def follow_job(self, job):
+        """Show the progress of a background job in this page. The page is reloaded when it's done."""
+        job.page = self.request.path
+        return job
+
+    def is_service_active(self, service, max_age=None):
+        # All watched services are queried at once and cached for a while
+        return service_state.is_active(service, max_age)
 
     def power_off(self):
         try:
-            if self.is_service_active("zynthian"):
+            if self.is_service_active("zynthian", max_age=0):
                 liblo.send(zynthian_ui_osc_addr, "/CUIA/POWER_OFF", ("s", "CONFIRM"))
                 sleep(5)
             check_output("killall -SIGQUIT zynthian_gui.py; sleep 5; poweroff", shell=True)
@@ -168,7 +182,7 @@ class ZynthianBasicHandler(tornado.web.RequestHandler):
             self.reboot_flag = False
             if os.path.isfile(self.reboot_flag_fpath):
                 os.remove(self.reboot_flag_fpath)
-            if self.is_service_active("zynthian"):
+            if self.is_service_active("zynthian", max_age=0):
                 liblo.send(zynthian_ui_osc_addr, "/CUIA/REBOOT", ("s", "CONFIRM"))
                 sleep(5)
             check_output("killall -SIGINT zynthian_gui.py; sleep 5; reboot", shell=True)
@@ -247,3 +261,5 @@ class ZynthianConfigHandler(ZynthianBasicHandler):
         for vn in config:
             if vn[0] != '_':
                 os.environ[vn] = config[vn][0]
+        # Environment doesn't match the config file anymore => reload it on next request
+        config_cache.invalidate("config")
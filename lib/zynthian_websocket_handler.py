@@ -24,22 +24,53 @@
 
 import logging
 import asyncio
-import jsonpickle
 import tornado.websocket
 
+# Pending messages of a connection are sent together, in a single frame, once every interval (seconds)
+BATCH_INTERVAL = 0.05
+
+# ------------------------------------------------------------------------------
+# JSON codec for websocket messages: orjson if available, else json
+# ------------------------------------------------------------------------------
+
+try:
+    import orjson
+
+    def json_encode(obj):
+        return orjson.dumps(obj)
+
+    json_decode = orjson.loads
+
+except ImportError:
+    import json
+
+    def json_encode(obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+    json_decode = json.loads
+
 # ------------------------------------------------------------------------------
 # Zynthian Websocket Handling
 # ------------------------------------------------------------------------------
 
+# Message handler classes, by handler name. Filled when the classes are defined.
+message_handler_classes = {}
+
 
 def ZynthianWebSocketMessageHandlerFactory(handler_name, websocket):
-    for cls in ZynthianWebSocketMessageHandler.__subclasses__():
-        if cls.is_registered_for(handler_name):
-            return cls(handler_name, websocket)
-    raise ValueError
+    try:
+        return message_handler_classes[handler_name](handler_name, websocket)
+    except KeyError:
+        raise ValueError("Unknown websocket message handler '{}'".format(handler_name))
 
 
 class ZynthianWebSocketMessageHandler(object):
+
+    # Message handlers are registered with their class name
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        message_handler_classes[cls.__name__] = cls
+
     def __init__(self, handler_name, websocket):
         self.handler_name = handler_name
         self.websocket = websocket
@@ -54,6 +85,10 @@ class ZynthianWebSocketMessageHandler(object):
     def on_close(self):
         pass
 
+    def send(self, data):
+        """Queue a message for the client, to be sent in the next batch. Return a future resolved when it's sent."""
+        return self.websocket.send_message(ZynthianWebSocketMessage(self.handler_name, data))
+
 
 class ZynthianWebSocketMessage(object):
     def __init__(self, handler_name, data):
@@ -76,29 +111,153 @@ class ZynthianWebSocketMessage(object):
     def data(self, value):
         self._data = value
 
+    def to_dict(self):
+        return {'_handler_name': self._handler_name, '_data': self._data}
+
+    def encode(self):
+        return json_encode(self.to_dict())
+
 
 class ZynthianWebSocketHandler(tornado.websocket.WebSocketHandler):
-    handlers = []
+    # Live connections
+    connections = set()
+    # Subscribed connections, by topic
+    topics = {}
 
     def check_origin(self, origin):
         return True
 
+    def get_compression_options(self):
+        # Enable permessage-deflate with default options
+        return {}
+
     # the client connected
     def open(self):
         logging.info("New client connected to ZynthianWebSocketHandler")
+        # Message handlers of this connection, one per handler name
+        self.handlers = {}
+        # Messages pending to be sent in the next batch
+        self.outbox = []
+        self.outbox_future = None
+        self.subscriptions = set()
+        ZynthianWebSocketHandler.connections.add(self)
 
     # the client sent the message
     def on_message(self, message):
         if message:
-            decoded_message = jsonpickle.decode(message)
+            decoded_message = json_decode(message)
             logging.info("incoming ws message %s " % decoded_message)
-            handler = ZynthianWebSocketMessageHandlerFactory(
-                decoded_message['handler_name'], self)
+            handler = self.get_message_handler(decoded_message['handler_name'])
             handler.on_websocket_message(decoded_message['data'])
-            self.handlers.append(handler)
+
+    def get_message_handler(self, handler_name):
+        """Return the message handler for this connection, creating it on first use."""
+        try:
+            return self.handlers[handler_name]
+        except KeyError:
+            handler = ZynthianWebSocketMessageHandlerFactory(handler_name, self)
+            self.handlers[handler_name] = handler
+            handler.on_open()
+            return handler
 
     # client disconnected
     def on_close(self):
         logging.info("Client disconnected")
-        for handler in self.handlers:
-            handler.on_close()
+        ZynthianWebSocketHandler.connections.discard(self)
+        for topic in list(getattr(self, "subscriptions", ())):
+            self.unsubscribe(topic)
+        handlers = getattr(self, "handlers", {})
+        self.handlers = {}
+        for handler in handlers.values():
+            try:
+                handler.on_close()
+            except Exception as e:
+                logging.error("Error closing websocket message handler '{}' => {}".format(handler.handler_name, e))
+        logging.debug("Websocket stats: {}".format(self.get_stats()))
+
+    # --------------------------------------------------------------------------
+    # Batched sending
+    # --------------------------------------------------------------------------
+
+    def send_message(self, message):
+        """
+        Queue a ZynthianWebSocketMessage. Pending messages are coalesced into a single frame
+        per batch interval: a message object, or an array of them if there are several.
+        Return a future resolved when the frame has been written (or the connection is closed).
+        Must be called from the IOLoop.
+        """
+        self.outbox.append(message)
+        if self.outbox_future is None:
+            loop = asyncio.get_running_loop()
+            self.outbox_future = loop.create_future()
+            loop.call_later(BATCH_INTERVAL, self.flush_outbox)
+        return self.outbox_future
+
+    def flush_outbox(self):
+        messages = self.outbox
+        future = self.outbox_future
+        self.outbox = []
+        self.outbox_future = None
+        if len(messages) == 1:
+            frame = messages[0].encode()
+        else:
+            frame = json_encode([message.to_dict() for message in messages])
+        try:
+            self.write_message(frame).add_done_callback(lambda f: self.on_frame_written(f, future))
+        except tornado.websocket.WebSocketClosedError:
+            future.set_result(False)
+
+    @staticmethod
+    def on_frame_written(write_future, future):
+        # Closed connections are cleaned-up by on_close => don't propagate the error
+        future.set_result(write_future.exception() is None)
+
+    # --------------------------------------------------------------------------
+    # Topics
+    # --------------------------------------------------------------------------
+
+    def subscribe(self, topic):
+        self.subscriptions.add(topic)
+        ZynthianWebSocketHandler.topics.setdefault(topic, set()).add(self)
+
+    def unsubscribe(self, topic):
+        self.subscriptions.discard(topic)
+        conns = ZynthianWebSocketHandler.topics.get(topic)
+        if conns is not None:
+            conns.discard(self)
+            if not conns:
+                del ZynthianWebSocketHandler.topics[topic]
+
+    @classmethod
+    def publish(cls, topic, message):
+        """Queue a ZynthianWebSocketMessage for every connection subscribed to the topic. Must be called from the IOLoop."""
+        for conn in cls.topics.get(topic, ()):
+            conn.send_message(message)
+
+    @classmethod
+    def get_stats(cls):
+        """Return the number of live connections, message handlers (by handler name) and subscribers (by topic)."""
+        handlers = {}
+        for conn in cls.connections:
+            for handler_name in conn.handlers:
+                handlers[handler_name] = handlers.get(handler_name, 0) + 1
+        return {
+            "connections": len(cls.connections),
+            "handlers": handlers,
+            "topics": {topic: len(conns) for topic, conns in cls.topics.items()}
+        }
+
+
+class SubscriptionMessageHandler(ZynthianWebSocketMessageHandler):
+    """Subscribe the connection to topics, with "SUBSCRIBE <topic>" & "UNSUBSCRIBE <topic>" messages."""
+
+    def on_websocket_message(self, message):
+        parts = message.split(" ", maxsplit=1)
+        if len(parts) != 2 or not parts[1]:
+            logging.error("Bad subscription message: {}".format(message))
+        elif parts[0] == 'SUBSCRIBE':
+            self.websocket.subscribe(parts[1])
+        elif parts[0] == 'UNSUBSCRIBE':
+            self.websocket.unsubscribe(parts[1])
+        else:
+            logging.error("Unknown subscription action: {}".format(parts[0]))
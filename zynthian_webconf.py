@@ -45,12 +45,13 @@ from lib.audio_mixer_handler import AudioConfigMessageHandler, AudioMixerHandler
 from lib.repository_handler import RepositoryHandler
 from lib.midi_log_handler import MidiLogHandler
 from lib.ui_log_handler import UiLogHandler
-from lib.engines_handler import EnginesHandler
+from lib.engines_handler import EnginesHandler, EngineCatalogueHandler
 from lib.captures_config_handler import CapturesConfigHandler
 from lib.pianoteq_handler import PianoteqHandler
 from lib.dsp56300_handler import dsp56300Handler
 from lib.extrapacks_handler import ExtraPacksHandler
 from lib.zynthian_websocket_handler import ZynthianWebSocketHandler
+from lib.jobs_handler import JobsHandler
 from lib.presets_config_handler import PresetsConfigHandler
 from lib.software_update_handler import SoftwareUpdateHandler
 from lib.system_backup_handler import SystemBackupHandler
@@ -189,6 +190,7 @@ def make_app():
         (r"/sw-pianoteq$", PianoteqHandler),
         (r"/sw-dsp56300$", dsp56300Handler),
         (r"/sw-engines$", EnginesHandler),
+        (r"/sw-engines/catalogue$", EngineCatalogueHandler),
         (r"/sw-repos$", RepositoryHandler),
         (r"/ui-options$", UiConfigHandler),
         (r"/ui-keybind$", UiKeybindHandler),
@@ -203,6 +205,9 @@ def make_app():
         (r"/sys-reboot/confirmed$", RebootConfirmedHandler),
         (r"/sys-poweroff$", PoweroffHandler),
         (r'/upload$', UploadHandler),
+        (r"/jobs$", JobsHandler),
+        (r"/jobs/([0-9a-f]+)$", JobsHandler),
+        (r"/jobs/([0-9a-f]+)/(log|cancel)$", JobsHandler),
         (r"/ws$", ZynthianWebSocketHandler),
         (r"/zynterm", ZyntermHandler),
         (r"/zynterm_ws", TermSocket, {'term_manager': term_manager}),